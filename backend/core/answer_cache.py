@@ -0,0 +1,148 @@
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from backend.core import registry
+from backend.core.config import get_int, get_float, get_bool
+
+def normalize_question(question: str):
+    return re.sub(r"\s+", " ", question).strip().lower()
+
+def _scope(where):
+    # Answers retrieved under different filters are never interchangeable.
+    return json.dumps(where, sort_keys=True) if where else ""
+
+class AnswerCache:
+    """Answers keyed by the embedding of the standalone question.
+
+    A lookup returns the most similar cached answer when its cosine
+    similarity clears `threshold` and none of the sources it cited have been
+    touched since it was stored. Answers that cited nothing (e.g. "not
+    found") are invalidated by any write, since new data could change them.
+    Entries expire after `ttl` seconds and are evicted least recently used
+    first. Vectors live in one preallocated matrix so a lookup is a single
+    matrix-vector product.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, threshold: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._matrix = None
+        self._used = np.zeros(max_entries, dtype=bool)
+        self._entries = OrderedDict()
+        self._free = list(range(max_entries - 1, -1, -1))
+        self._versions = {}
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def _drop(self, slot: int):
+        del self._entries[slot]
+        self._used[slot] = False
+        self._free.append(slot)
+
+    def _valid(self, entry, now):
+        if now - entry["created"] > self.ttl:
+            return False
+        if not entry["versions"]:
+            return entry["generation"] == self._generation
+        return all(self._versions.get(source, 0) == version for source, version in entry["versions"].items())
+
+    def lookup(self, embedding, where: dict = None):
+        scope = _scope(where)
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        with self._lock:
+            if self._matrix is None or not self._entries or self._matrix.shape[1] != query.shape[0]:
+                self._misses += 1
+                return None
+            scores = self._matrix @ query
+            scores[~self._used] = -np.inf
+            now = time.time()
+            for slot in np.argsort(-scores):
+                if scores[slot] < self.threshold:
+                    break
+                entry = self._entries[int(slot)]
+                if entry["scope"] != scope:
+                    continue
+                if not self._valid(entry, now):
+                    self._drop(int(slot))
+                    continue
+                self._entries.move_to_end(int(slot))
+                self._hits += 1
+                return entry
+            self._misses += 1
+            return None
+
+    def store(self, embedding, answer: str, documents, where: dict = None):
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        sources = {doc.metadata.get("source", "Unknown") for doc in documents}
+        with self._lock:
+            if self._matrix is None or self._matrix.shape[1] != vector.shape[0]:
+                self._matrix = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                self._entries.clear()
+                self._used[:] = False
+                self._free = list(range(self.max_entries - 1, -1, -1))
+            if not self._free:
+                self._drop(next(iter(self._entries)))
+            slot = self._free.pop()
+            self._matrix[slot] = vector
+            self._used[slot] = True
+            self._entries[slot] = {
+                "answer": answer,
+                "scope": _scope(where),
+                "documents": documents,
+                "versions": {source: self._versions.get(source, 0) for source in sources},
+                "generation": self._generation,
+                "created": time.time()
+            }
+
+    def invalidate_sources(self, sources):
+        with self._lock:
+            self._generation += 1
+            for source in sources:
+                self._versions[source] = self._versions.get(source, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            for slot in list(self._entries):
+                self._drop(slot)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "entries": len(self._entries)
+            }
+
+def get_answer_cache():
+    if not get_bool("ANSWER_CACHE_ENABLED", True):
+        return None
+    return registry.get_or_create("answer_cache", lambda: AnswerCache(
+        max_entries=get_int("ANSWER_CACHE_MAX_ENTRIES", 1000),
+        ttl=get_float("ANSWER_CACHE_TTL_SECONDS", 86400),
+        threshold=get_float("ANSWER_CACHE_THRESHOLD", 0.95)
+    ))
+
+def invalidate_sources(sources):
+    cache = get_answer_cache()
+    if cache is not None:
+        cache.invalidate_sources(sources)
+
+def invalidate_all():
+    cache = get_answer_cache()
+    if cache is not None:
+        cache.clear()
+
+def get_answer_cache_stats():
+    cache = get_answer_cache()
+    return cache.stats() if cache is not None else None
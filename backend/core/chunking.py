@@ -0,0 +1,135 @@
+import re
+import numpy as np
+from langchain_core.documents import Document
+
+# Imported by spawned PDF workers, so only the standard library, NumPy and
+# langchain_core here; settings are read by the caller and passed in.
+DEFAULT_MAX_TOKENS = 320
+DEFAULT_MIN_TOKENS = 64
+CHARS_PER_TOKEN = 4
+
+_BLOCK_BREAK = re.compile(r"\n[ \t]*\n+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_MARKDOWN_HEADING = re.compile(r"^#{1,6}\s+\S")
+_NUMBERED_HEADING = re.compile(r"^(\d+(\.\d+)*\.?|[IVX]+\.|[A-Z]\.)\s+\S")
+
+# Where the quoted history of a reply starts; everything after it is a copy
+# of earlier mail that is (or was) indexed in its own right.
+_REPLY_MARKERS = re.compile(
+    r"^(On .{0,200}wrote:\s*$"
+    r"|-{2,}\s*Original Message\s*-{2,}"
+    r"|From:\s.+\n(Sent|Date):\s)",
+    re.IGNORECASE | re.MULTILINE
+)
+# A forwarded message is content in its own right, not history; its header
+# block (From:/Date:) must not be taken for the start of a quote.
+_FORWARD_MARKER = re.compile(r"^-{2,}\s*Forwarded message\s*-{2,}", re.IGNORECASE | re.MULTILINE)
+
+def strip_quoted_replies(text: str):
+    forward = _FORWARD_MARKER.search(text)
+    match = _REPLY_MARKERS.search(text, 0, forward.start() if forward else len(text))
+    if match:
+        text = text[:match.start()]
+    return "\n".join(line for line in text.splitlines() if not line.lstrip().startswith(">")).strip()
+
+def _is_heading(block: str):
+    if "\n" in block or len(block) > 80:
+        return False
+    if _MARKDOWN_HEADING.match(block) or (_NUMBERED_HEADING.match(block) and not block.endswith(".")):
+        return True
+    words = block.split()
+    return 0 < len(words) <= 10 and block[0].isupper() and block[-1] not in ".!?,;:" and (
+        block.isupper() or sum(w[0].isupper() for w in words if w[0].isalpha()) >= len(words) / 2
+    )
+
+def _pieces(block: str, max_chars: int):
+    """Split an oversized block into runs of whole sentences that fit."""
+    piece = ""
+    for sentence in _SENTENCE_END.split(block):
+        # A single sentence over budget is cut at whitespace.
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > max_chars // 2 else max_chars
+            if piece:
+                yield piece
+                piece = ""
+            yield sentence[:cut].strip()
+            sentence = sentence[cut:].strip()
+        if piece and len(piece) + 1 + len(sentence) > max_chars:
+            yield piece
+            piece = ""
+        piece = f"{piece} {sentence}" if piece else sentence
+    if piece:
+        yield piece
+
+def _blocks(text: str, max_tokens: int):
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    blocks = []
+    for block in _BLOCK_BREAK.split(text):
+        block = block.strip()
+        if not block:
+            continue
+        if len(block) <= max_chars:
+            blocks.append(block)
+        else:
+            blocks.extend(_pieces(block, max_chars))
+    return blocks
+
+def chunk_text(text: str, max_tokens: int = DEFAULT_MAX_TOKENS, min_tokens: int = DEFAULT_MIN_TOKENS):
+    """Pack paragraphs into chunks of at most `max_tokens` (estimated).
+
+    Returns (chunk text, section heading) pairs. Chunks break between
+    paragraphs, never inside one unless it alone exceeds the budget, and a
+    heading starts a new chunk once the current one holds `min_tokens`.
+    Packing works on cumulative block sizes, so each chunk costs one binary
+    search rather than a pass per paragraph. There is no overlap; chunks
+    that continue a section are prefixed with its heading instead.
+    """
+    blocks = _blocks(text, max_tokens)
+    if not blocks:
+        return []
+    sizes = np.fromiter((len(b) for b in blocks), dtype=np.int64, count=len(blocks)) // CHARS_PER_TOKEN + 1
+    offsets = np.concatenate(([0], np.cumsum(sizes)))
+    headings = np.flatnonzero(np.fromiter((_is_heading(b) for b in blocks), dtype=bool, count=len(blocks)))
+
+    chunks = []
+    start = 0
+    while start < len(blocks):
+        end = max(start + 1, int(np.searchsorted(offsets, offsets[start] + max_tokens, side="right")) - 1)
+        # Break at the first heading past the minimum fill.
+        lo, hi = np.searchsorted(headings, [start + 1, end])
+        for h in headings[lo:hi]:
+            if offsets[h] - offsets[start] >= min_tokens:
+                end = int(h)
+                break
+        if end == start + 1 < len(blocks) and start in headings:
+            # A heading that can't share a chunk with its next block would
+            # stand alone; the chunks after it carry it as a prefix anyway.
+            start = end
+            continue
+        section_index = np.searchsorted(headings, start, side="right") - 1
+        section = blocks[headings[section_index]] if section_index >= 0 else ""
+        body = "\n\n".join(blocks[start:end])
+        if section and headings[section_index] != start:
+            body = f"{section}\n\n{body}"
+        chunks.append((body, section.lstrip("# ")))
+        start = end
+    return chunks
+
+def chunk_documents(docs, max_tokens: int = DEFAULT_MAX_TOKENS, min_tokens: int = DEFAULT_MIN_TOKENS, strip_quotes: bool = False):
+    """Chunk each document, copying its metadata onto every chunk."""
+    chunks = []
+    for doc in docs:
+        text = strip_quoted_replies(doc.page_content) if strip_quotes else doc.page_content
+        for body, section in chunk_text(text, max_tokens, min_tokens):
+            metadata = dict(doc.metadata)
+            if section:
+                metadata["section"] = section
+            chunks.append(Document(page_content=body, metadata=metadata))
+    return chunks
+
+def chunk_limits():
+    """(max_tokens, min_tokens) from CHUNK_MAX_TOKENS / CHUNK_MIN_TOKENS."""
+    from backend.core.config import get_int
+
+    return get_int("CHUNK_MAX_TOKENS", DEFAULT_MAX_TOKENS), get_int("CHUNK_MIN_TOKENS", DEFAULT_MIN_TOKENS)
@@ -0,0 +1,37 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from backend.core import registry
+from backend.core.config import get_int
+
+# Per-endpoint caps on requests being served at once. Requests over the cap
+# wait for a slot instead of piling more work onto the executor.
+ENDPOINT_LIMITS = {
+    "chat": ("API_CHAT_CONCURRENCY", 32),
+    "ingest": ("API_INGEST_CONCURRENCY", 8),
+    "admin": ("API_ADMIN_CONCURRENCY", 4),
+}
+
+_semaphores = {}
+
+def get_executor():
+    return registry.get_or_create("io_executor", lambda: ThreadPoolExecutor(
+        max_workers=get_int("API_IO_WORKERS", 16),
+        thread_name_prefix="pkaa-io"
+    ))
+
+def install_default_executor():
+    """Route run_in_executor(None, ...) calls, including LangChain's async
+    fallbacks for sync-only components like Chroma, onto our bounded pool."""
+    asyncio.get_running_loop().set_default_executor(get_executor())
+
+async def offload(fn, *args, **kwargs):
+    """Run blocking disk, SQLite or CPU work off the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(fn, *args, **kwargs))
+
+def throttle(endpoint: str):
+    if endpoint not in _semaphores:
+        setting, default = ENDPOINT_LIMITS[endpoint]
+        _semaphores[endpoint] = asyncio.Semaphore(get_int(setting, default))
+    return _semaphores[endpoint]
@@ -0,0 +1,22 @@
+import os
+import streamlit as st
+
+def get_setting(name: str, default=None):
+    try:
+        if name in st.secrets:
+            return st.secrets[name]
+    except FileNotFoundError:
+        pass
+    return os.environ.get(name, default)
+
+def get_int(name: str, default: int) -> int:
+    return int(get_setting(name, default))
+
+def get_float(name: str, default: float) -> float:
+    return float(get_setting(name, default))
+
+def get_bool(name: str, default: bool) -> bool:
+    value = get_setting(name, default)
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
@@ -0,0 +1,215 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+class EmbeddingCacheStore:
+    """Vectors live in a memory-mapped float32 matrix; a SQLite table maps
+    content hashes to matrix rows and tracks recency for eviction.
+
+    Several processes (the API, Streamlit, the CLIs) may share a directory:
+    rows are allocated and the file grown only under SQLite's write lock.
+    """
+
+    def __init__(self, directory: str, max_entries: int):
+        os.makedirs(directory, exist_ok=True)
+        self.max_entries = max_entries
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite3"), check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, row INTEGER NOT NULL, last_used REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+            CREATE TABLE IF NOT EXISTS free_rows (row INTEGER PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        """)
+        meta = dict(self._db.execute("SELECT name, value FROM meta").fetchall())
+        self.dim = meta.get("dim")
+        self._matrix = None
+        if self.dim and os.path.exists(self._vectors_path):
+            self._open_matrix()
+
+    def _open_matrix(self):
+        rows = os.path.getsize(self._vectors_path) // (4 * self.dim)
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(rows, self.dim)) if rows else None
+
+    def _ensure_capacity(self, rows: int):
+        capacity = 0 if self._matrix is None else self._matrix.shape[0]
+        if rows <= capacity:
+            return
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        # Another process may already have grown the file past our mapping.
+        on_disk = os.path.getsize(self._vectors_path) // (4 * self.dim) if os.path.exists(self._vectors_path) else 0
+        if rows > on_disk:
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(max(rows, on_disk * 2, 1024) * self.dim * 4)
+        self._open_matrix()
+
+    @contextmanager
+    def _transaction(self):
+        """This thread's lock plus SQLite's write lock, held across processes."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+                self._db.commit()
+            except BaseException:
+                self._db.rollback()
+                raise
+
+    def get_many(self, keys):
+        if not keys:
+            return {}
+        # Rows are read under the write lock too, so another process can't
+        # evict and reuse one between the lookup and the read.
+        with self._transaction():
+            found = {}
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                found.update(self._db.execute(
+                    f"SELECT key, row FROM entries WHERE key IN ({placeholders})", batch
+                ).fetchall())
+            if not found:
+                return {}
+            now = time.time()
+            self._db.executemany("UPDATE entries SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+            if self._matrix is None or max(found.values()) >= self._matrix.shape[0]:
+                # Written by another process since the file was mapped.
+                if self.dim is None:
+                    self.dim = self._db.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()[0]
+                self._open_matrix()
+            return {key: np.array(self._matrix[row]) for key, row in found.items()}
+
+    def put_many(self, items):
+        if not items:
+            return
+        with self._transaction():
+            self._put_many(items)
+
+    def _put_many(self, items):
+        # Re-read under the write lock: another process may have allocated rows.
+        meta = dict(self._db.execute("SELECT name, value FROM meta").fetchall())
+        self.dim = meta.get("dim", self.dim)
+        next_row = meta.get("next_row", 0)
+        if self.dim is None:
+            self.dim = len(items[0][1])
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (self.dim,))
+        items = list({k: v for k, v in items if len(v) == self.dim}.items())
+        if not items:
+            return
+        # Keys already cached are overwritten in place rather than orphaning their row.
+        slots = {}
+        for start in range(0, len(items), 500):
+            batch = [k for k, _ in items[start:start + 500]]
+            slots.update(self._db.execute(
+                f"SELECT key, row FROM entries WHERE key IN ({','.join('?' * len(batch))})", batch
+            ).fetchall())
+        fresh = [k for k, _ in items if k not in slots]
+        free = [r for (r,) in self._db.execute("SELECT row FROM free_rows LIMIT ?", (len(fresh),))]
+        if free:
+            self._db.executemany("DELETE FROM free_rows WHERE row = ?", [(r,) for r in free])
+        rows = free + list(range(next_row, next_row + len(fresh) - len(free)))
+        next_row = max(next_row, rows[-1] + 1) if rows else next_row
+        self._ensure_capacity(next_row)
+        slots.update(zip(fresh, rows))
+
+        now = time.time()
+        for key, vector in items:
+            self._matrix[slots[key]] = np.asarray(vector, dtype=np.float32)
+        self._matrix.flush()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+            [(key, slots[key], now) for key, _ in items]
+        )
+        self._db.execute("INSERT OR REPLACE INTO meta VALUES ('next_row', ?)", (next_row,))
+        self._evict()
+
+    def _evict(self):
+        count = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        # Evict down to 90% so we don't pay for a delete on every insert.
+        excess = count - int(self.max_entries * 0.9)
+        victims = self._db.execute(
+            "SELECT key, row FROM entries ORDER BY last_used LIMIT ?", (excess,)
+        ).fetchall()
+        self._db.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k, _ in victims])
+        self._db.executemany("INSERT OR IGNORE INTO free_rows VALUES (?)", [(r,) for _, r in victims])
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+class CachedEmbeddings(Embeddings):
+    """Content-addressed cache in front of a remote embedding model."""
+
+    def __init__(self, embeddings: Embeddings, cache_dir: str, model: str, task_type: str = "", max_entries: int = 200_000):
+        self.embeddings = embeddings
+        self.model = model
+        self.task_type = task_type or ""
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model)
+        self.store = EmbeddingCacheStore(os.path.join(cache_dir, slug), max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._counter_lock = threading.Lock()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{self.task_type}\0{text}".encode("utf-8")).hexdigest()
+
+    def embed_documents(self, texts):
+        keys = [self._key(t) for t in texts]
+        cached = self.store.get_many(list(set(keys)))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+
+        with self._counter_lock:
+            self.hits += sum(1 for k in keys if k in cached)
+            self.misses += len(missing)
+
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            fresh = list(zip(missing.keys(), vectors))
+            self.store.put_many(fresh)
+            cached.update((k, np.asarray(v, dtype=np.float32)) for k, v in fresh)
+
+        return [cached[k].tolist() for k in keys]
+
+    def refresh(self, texts):
+        """Embed `texts` with the model and overwrite their cached vectors."""
+        vectors = self.embeddings.embed_documents(list(texts))
+        self.store.put_many([(self._key(t), v) for t, v in zip(texts, vectors)])
+        return [list(v) for v in vectors]
+
+    def embed_query(self, text: str):
+        key = self._key(text)
+        cached = self.store.get_many([key])
+        if key in cached:
+            with self._counter_lock:
+                self.hits += 1
+            return cached[key].tolist()
+
+        with self._counter_lock:
+            self.misses += 1
+        vector = self.embeddings.embed_query(text)
+        self.store.put_many([(key, vector)])
+        return list(vector)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self.store),
+        }
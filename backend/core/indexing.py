@@ -0,0 +1,268 @@
+import hashlib
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from langchain_core.documents import Document
+from backend.core.config import get_setting, get_int, get_float
+from backend.core.vector_store import get_vector_store, get_embeddings, delete_chunks
+from backend.core.answer_cache import invalidate_sources
+from backend.core import keyword_index, metrics
+
+class TokenBucket:
+    def __init__(self, rate_per_sec: float, capacity: float):
+        self.rate = rate_per_sec
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+_bucket = None
+_bucket_lock = threading.Lock()
+
+_totals = {"chunks": 0, "seconds": 0.0, "retries": 0}
+_totals_lock = threading.Lock()
+
+def _get_bucket():
+    global _bucket
+    with _bucket_lock:
+        if _bucket is None:
+            per_minute = get_float("EMBED_REQUESTS_PER_MINUTE", 100)
+            _bucket = TokenBucket(per_minute / 60.0, capacity=max(1.0, get_float("EMBED_BURST", 5)))
+        return _bucket
+
+def _is_quota_error(e: Exception):
+    message = str(e).lower()
+    return "429" in message or "quota" in message or "resource_exhausted" in message or "rate limit" in message
+
+def _embed_batch(texts, refresh: bool = False):
+    max_retries = get_int("EMBED_MAX_RETRIES", 6)
+    base_delay = get_float("EMBED_BACKOFF_BASE", 1.0)
+    max_delay = get_float("EMBED_BACKOFF_MAX", 60.0)
+
+    # Local backends have no quota to pace against.
+    remote = get_setting("EMBEDDING_BACKEND", "google") == "google"
+    for attempt in range(max_retries + 1):
+        if remote:
+            _get_bucket().acquire()
+        try:
+            embeddings = get_embeddings()
+            if refresh and hasattr(embeddings, "refresh"):
+                return embeddings.refresh(texts)
+            return embeddings.embed_documents(texts)
+        except Exception as e:
+            if not _is_quota_error(e) or attempt == max_retries:
+                raise
+            with _totals_lock:
+                _totals["retries"] += 1
+            # Full jitter keeps parallel workers from retrying in lockstep.
+            time.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
+
+def index_documents(splits, ids=None, progress=None, refresh: bool = False):
+    """Embed and store chunks in bounded, rate-limited parallel batches.
+
+    Each batch is written to Chroma as soon as its embeddings arrive, so a
+    failure part-way through keeps everything that already finished.
+    `refresh` bypasses the embedding cache and overwrites its entries.
+    """
+    if not splits:
+        return {"chunks": 0, "seconds": 0.0, "chunks_per_sec": 0.0}
+
+    batch_size = get_int("EMBED_BATCH_SIZE", 100)
+    max_in_flight = get_int("EMBED_MAX_IN_FLIGHT", 4)
+    ids = ids or [str(uuid.uuid4()) for _ in splits]
+    collection = get_vector_store()._collection
+
+    start = time.perf_counter()
+    done = 0
+    pool = ThreadPoolExecutor(max_workers=max_in_flight)
+    try:
+        futures = {}
+        for offset in range(0, len(splits), batch_size):
+            batch = splits[offset:offset + batch_size]
+            future = pool.submit(_embed_batch, [doc.page_content for doc in batch], refresh)
+            futures[future] = (batch, ids[offset:offset + batch_size])
+
+        for future in as_completed(futures):
+            batch, batch_ids = futures[future]
+            texts = [doc.page_content for doc in batch]
+            metadatas = [doc.metadata for doc in batch]
+            collection.upsert(ids=batch_ids, embeddings=future.result(), documents=texts, metadatas=metadatas)
+            keyword_index.add_chunks(batch_ids, texts, metadatas)
+            done += len(batch)
+            if progress:
+                progress(embeddings=len(batch))
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+        elapsed = time.perf_counter() - start
+        with _totals_lock:
+            _totals["chunks"] += done
+            _totals["seconds"] += elapsed
+
+    return {"chunks": done, "seconds": elapsed, "chunks_per_sec": done / elapsed if elapsed else 0.0}
+
+def get_indexing_stats():
+    with _totals_lock:
+        totals = dict(_totals)
+    totals["chunks_per_sec"] = totals["chunks"] / totals["seconds"] if totals["seconds"] else 0.0
+    return totals
+
+def make_chunk_ids(splits, source_key, counts=None):
+    """Deterministic chunk ids from a source identity plus the chunk's content hash.
+
+    `source_key` is a string or a function of the chunk metadata. Repeated
+    identical chunks within one source get an occurrence suffix so every
+    chunk still has a unique id.
+    """
+    counts = Counter() if counts is None else counts
+    ids = []
+    for split in splits:
+        key = source_key(split.metadata) if callable(source_key) else source_key
+        content_hash = hashlib.sha256(split.page_content.encode("utf-8")).hexdigest()
+        occurrence = counts[(key, content_hash)]
+        counts[(key, content_hash)] += 1
+        ids.append(hashlib.sha256(f"{key}\0{content_hash}\0{occurrence}".encode("utf-8")).hexdigest())
+    return ids
+
+# Loader date fields, most specific first; the first that parses becomes
+# date_epoch so retrieval can filter on date ranges with numeric operators.
+DATE_FIELDS = ("date", "last_modified", "upload_timestamp", "ingestion_timestamp")
+
+def to_epoch(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        try:
+            parsed = parsedate_to_datetime(value)
+        except (TypeError, ValueError, IndexError):
+            return None
+    return parsed.timestamp()
+
+def add_filter_fields(metadata: dict):
+    """Derive the normalized fields retrieval filters use."""
+    for field in DATE_FIELDS:
+        epoch = to_epoch(metadata.get(field))
+        if epoch is not None:
+            metadata["date_epoch"] = epoch
+            break
+    for field in ("ingestion_timestamp", "upload_timestamp"):
+        epoch = to_epoch(metadata.get(field))
+        if epoch is not None:
+            metadata["ingested_epoch"] = epoch
+            break
+    sender = metadata.get("sender")
+    if sender:
+        match = re.search(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+", sender)
+        if match:
+            metadata["sender_email"] = match.group(0).lower()
+
+def _existing_ids(collection, ids):
+    existing = set()
+    for offset in range(0, len(ids), 500):
+        existing.update(collection.get(ids=ids[offset:offset + 500], include=[])["ids"])
+    return existing
+
+def upsert_documents(splits, ids, progress=None):
+    """Embed only chunks whose id isn't stored yet; refresh metadata on the rest."""
+    collection = get_vector_store()._collection
+    existing = _existing_ids(collection, ids)
+    for split in splits:
+        add_filter_fields(split.metadata)
+        metrics.observe("chunk_tokens", len(split.page_content) / 4)
+
+    fresh = [(split, chunk_id) for split, chunk_id in zip(splits, ids) if chunk_id not in existing]
+    unchanged = [(split, chunk_id) for split, chunk_id in zip(splits, ids) if chunk_id in existing]
+    if unchanged:
+        collection.update(ids=[i for _, i in unchanged], metadatas=[s.metadata for s, _ in unchanged])
+        keyword_index.update_metadata([i for _, i in unchanged], [s.metadata for s, _ in unchanged])
+    if fresh:
+        index_documents([s for s, _ in fresh], [i for _, i in fresh], progress=progress)
+    if splits:
+        invalidate_sources({split.metadata.get("source", "Unknown") for split in splits})
+    return {"added": len(fresh), "unchanged": len(unchanged)}
+
+class SourceIndexer:
+    """Idempotent, streaming re-index of a single source.
+
+    Chunks are added in as many calls as the caller likes; `finish()` then
+    deletes whatever the source had before that was not re-emitted. New
+    chunks land before old ones are removed, so the source is never missing.
+    """
+
+    def __init__(self, source_key: str, where: dict, progress=None):
+        self.source_key = source_key
+        self.where = where
+        self.progress = progress
+        self.stats = {"added": 0, "unchanged": 0, "removed": 0}
+        self._ids = set()
+        self._counts = Counter()
+
+    def add(self, splits):
+        ids = make_chunk_ids(splits, self.source_key, self._counts)
+        self._ids.update(ids)
+        result = upsert_documents(splits, ids, progress=self.progress)
+        self.stats["added"] += result["added"]
+        self.stats["unchanged"] += result["unchanged"]
+
+    def finish(self):
+        collection = get_vector_store()._collection
+        stale = [i for i in collection.get(where=self.where, include=[])["ids"] if i not in self._ids]
+        if stale:
+            delete_chunks(ids=stale)
+        self.stats["removed"] = len(stale)
+        metrics.observe("chunks_per_document", len(self._ids))
+        return self.stats
+
+def upsert_source(source_key: str, where: dict, splits, progress=None):
+    indexer = SourceIndexer(source_key, where, progress)
+    indexer.add(splits)
+    return indexer.finish()
+
+def reindex_where(where: dict = None, progress=None):
+    """Re-embed the chunks matching `where` and refresh their derived fields.
+
+    Matching ids are listed first, then text and metadata are read back in
+    pages (never the stored vectors) and re-embedded with the model itself,
+    bypassing the embedding cache. Filter fields and keyword index rows are
+    rewritten along the way, which also backfills chunks indexed before
+    those fields existed.
+    """
+    collection = get_vector_store()._collection
+    page_size = get_int("EMBED_BATCH_SIZE", 100) * get_int("EMBED_MAX_IN_FLIGHT", 4)
+    ids, offset = [], 0
+    while True:
+        page = collection.get(where=where, limit=page_size, offset=offset, include=[])["ids"]
+        if not page:
+            break
+        ids.extend(page)
+        offset += len(page)
+
+    for start in range(0, len(ids), page_size):
+        page = collection.get(ids=ids[start:start + page_size], include=["documents", "metadatas"])
+        splits = [Document(page_content=text, metadata=metadata or {}) for text, metadata in zip(page["documents"], page["metadatas"])]
+        for split in splits:
+            add_filter_fields(split.metadata)
+        if progress:
+            progress(chunks=len(splits))
+        index_documents(splits, page["ids"], progress=progress, refresh=True)
+        invalidate_sources({split.metadata.get("source", "Unknown") for split in splits})
+    return len(ids)
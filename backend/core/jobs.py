@@ -0,0 +1,161 @@
+import json
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from backend.core import registry
+from backend.core.config import get_setting, get_int
+
+_handlers = {}
+
+def register_handler(kind: str, handler, concurrency: int = 1):
+    """Register `handler(params, progress)` for jobs of `kind`.
+
+    At most `concurrency` jobs of the same kind run at once, so a long Drive
+    sync can't starve PDF uploads of workers. Each unit has one reporter:
+    loaders report documents and chunks as they are produced, the indexer
+    reports embeddings as batches are written.
+    """
+    _handlers[kind] = (handler, concurrency)
+
+class JobQueue:
+    def __init__(self, db_path: str, max_workers: int):
+        self.max_workers = max_workers
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                params TEXT NOT NULL,
+                status TEXT NOT NULL,
+                documents INTEGER NOT NULL DEFAULT 0,
+                chunks INTEGER NOT NULL DEFAULT 0,
+                embeddings INTEGER NOT NULL DEFAULT 0,
+                errors INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+        """)
+        if "errors" not in {row["name"] for row in self._db.execute("PRAGMA table_info(jobs)")}:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN errors INTEGER NOT NULL DEFAULT 0")
+            self._db.commit()
+        self._running = {}
+        self._pool = None
+
+    def start(self):
+        with self._lock:
+            if self._pool is not None:
+                return
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pkaa-job")
+            # Jobs interrupted by a restart start over; loaders are idempotent.
+            # Their counters start over too, or the re-run would be counted twice.
+            self._db.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL, documents = 0, chunks = 0, embeddings = 0, errors = 0 "
+                "WHERE status = 'running'"
+            )
+            self._db.commit()
+        self._dispatch()
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, kind: str, params: dict) -> str:
+        if kind not in _handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, params, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                (job_id, kind, json.dumps(params), time.time())
+            )
+            self._db.commit()
+        self._dispatch()
+        return job_id
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, limit: int = 50):
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def _to_dict(self, row):
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["progress"] = {
+            "documents": job.pop("documents"),
+            "chunks": job.pop("chunks"),
+            "embeddings": job.pop("embeddings"),
+            "errors": job.pop("errors"),
+        }
+        return job
+
+    def _dispatch(self):
+        with self._lock:
+            if self._pool is None:
+                return
+            queued = self._db.execute(
+                "SELECT id, kind, params FROM jobs WHERE status = 'queued' ORDER BY created_at"
+            ).fetchall()
+            for row in queued:
+                if sum(self._running.values()) >= self.max_workers:
+                    break
+                kind = row["kind"]
+                if kind not in _handlers:
+                    continue
+                if self._running.get(kind, 0) >= _handlers[kind][1]:
+                    continue
+                self._running[kind] = self._running.get(kind, 0) + 1
+                self._db.execute(
+                    "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?", (time.time(), row["id"])
+                )
+                self._pool.submit(self._run, row["id"], kind, json.loads(row["params"]))
+            self._db.commit()
+
+    def _progress(self, job_id: str):
+        def progress(documents: int = 0, chunks: int = 0, embeddings: int = 0, errors: int = 0):
+            with self._lock:
+                self._db.execute(
+                    "UPDATE jobs SET documents = documents + ?, chunks = chunks + ?, embeddings = embeddings + ?, "
+                    "errors = errors + ? WHERE id = ?",
+                    (documents, chunks, embeddings, errors, job_id)
+                )
+                self._db.commit()
+        return progress
+
+    def _run(self, job_id: str, kind: str, params: dict):
+        handler = _handlers[kind][0]
+        status, result, error = "succeeded", None, None
+        try:
+            result = handler(params, self._progress(job_id))
+        except Exception as e:
+            status, error = "failed", f"{e}\n{traceback.format_exc()}"
+        with self._lock:
+            self._running[kind] -= 1
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, json.dumps(result), error, time.time(), job_id)
+            )
+            self._db.commit()
+        self._dispatch()
+
+def get_job_queue():
+    return registry.get_or_create("job_queue", lambda: JobQueue(
+        get_setting("JOB_DB_PATH", "./jobs.sqlite3"),
+        max_workers=get_int("JOB_WORKERS", 4)
+    ))
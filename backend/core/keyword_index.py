@@ -0,0 +1,161 @@
+import json
+import re
+import sqlite3
+import threading
+from langchain_core.documents import Document
+from backend.core import registry
+from backend.core.config import get_setting
+
+# Local BM25 index over chunk text plus the metadata people search by
+# (subjects, senders, filenames). It mirrors the Chroma collection and is
+# kept in step by the indexing and delete paths.
+KEYWORD_FIELDS = ("source", "filename", "subject", "sender", "title")
+
+STOPWORDS = frozenset("""
+a an and are as at be by can did do does for from had has have how i in is it its
+me my of on or our so than that the their there this to was we were what when where
+which who why will with you your about any all
+""".split())
+
+_lock = threading.Lock()
+
+def _connect():
+    db = sqlite3.connect(get_setting("KEYWORD_INDEX_PATH", "./keyword_index.sqlite3"), check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.executescript("""
+        CREATE TABLE IF NOT EXISTS chunks (
+            rowid INTEGER PRIMARY KEY,
+            chunk_id TEXT UNIQUE NOT NULL,
+            fields TEXT NOT NULL,
+            content TEXT NOT NULL,
+            metadata TEXT NOT NULL
+        );
+        CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+            fields, content, content='chunks', content_rowid='rowid',
+            tokenize='unicode61 remove_diacritics 2'
+        );
+        CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
+            INSERT INTO chunks_fts(rowid, fields, content) VALUES (new.rowid, new.fields, new.content);
+        END;
+        CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN
+            INSERT INTO chunks_fts(chunks_fts, rowid, fields, content) VALUES ('delete', old.rowid, old.fields, old.content);
+        END;
+        CREATE TRIGGER IF NOT EXISTS chunks_au AFTER UPDATE ON chunks BEGIN
+            INSERT INTO chunks_fts(chunks_fts, rowid, fields, content) VALUES ('delete', old.rowid, old.fields, old.content);
+            INSERT INTO chunks_fts(rowid, fields, content) VALUES (new.rowid, new.fields, new.content);
+        END;
+    """)
+    db.commit()
+    return db
+
+def _db():
+    return registry.get_or_create("keyword_index_db", _connect)
+
+def _fields(metadata: dict):
+    return " ".join(str(metadata[key]) for key in KEYWORD_FIELDS if metadata.get(key))
+
+def add_chunks(ids, texts, metadatas):
+    rows = [(i, _fields(m or {}), t, json.dumps(m or {})) for i, t, m in zip(ids, texts, metadatas)]
+    with _lock:
+        db = _db()
+        db.executemany("""
+            INSERT INTO chunks (chunk_id, fields, content, metadata) VALUES (?, ?, ?, ?)
+            ON CONFLICT(chunk_id) DO UPDATE SET
+                fields = excluded.fields, content = excluded.content, metadata = excluded.metadata
+        """, rows)
+        db.commit()
+
+def update_metadata(ids, metadatas):
+    rows = [(_fields(m or {}), json.dumps(m or {}), i) for i, m in zip(ids, metadatas)]
+    with _lock:
+        db = _db()
+        db.executemany("UPDATE chunks SET fields = ?, metadata = ? WHERE chunk_id = ?", rows)
+        db.commit()
+
+def delete_chunks(ids):
+    with _lock:
+        db = _db()
+        for offset in range(0, len(ids), 500):
+            batch = ids[offset:offset + 500]
+            db.execute(f"DELETE FROM chunks WHERE chunk_id IN ({','.join('?' * len(batch))})", batch)
+        db.commit()
+
+def clear():
+    with _lock:
+        db = _db()
+        db.execute("DELETE FROM chunks")
+        db.execute("INSERT INTO chunks_fts(chunks_fts) VALUES ('rebuild')")
+        db.commit()
+
+def vacuum():
+    with _lock:
+        _db().execute("VACUUM")
+
+def count():
+    with _lock:
+        return _db().execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+def query_terms(text: str):
+    terms = []
+    for term in re.findall(r"\w+(?:[-@.'_/]\w+)*", text.lower()):
+        if term not in STOPWORDS and term not in terms:
+            terms.append(term)
+    return terms[:32]
+
+_SQL_OPERATORS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+def sql_filter(where: dict):
+    """Translate a Chroma `where` clause into SQL over the stored metadata."""
+    clauses, params = [], []
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            parts = [sql_filter(part) for part in condition]
+            clauses.append("(" + f" {key[1:].upper()} ".join(sql for sql, _ in parts) + ")")
+            params.extend(p for _, part_params in parts for p in part_params)
+            continue
+        if not re.fullmatch(r"\w+", key):
+            raise ValueError(f"Unsupported metadata field: {key}")
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        column = f"json_extract(c.metadata, '$.{key}')"
+        for operator, value in condition.items():
+            if operator in ("$in", "$nin"):
+                placeholders = ",".join("?" * len(value))
+                clauses.append(f"{column} {'NOT IN' if operator == '$nin' else 'IN'} ({placeholders})")
+                params.extend(value)
+            else:
+                clauses.append(f"{column} {_SQL_OPERATORS[operator]} ?")
+                params.append(value)
+    return " AND ".join(clauses), params
+
+def search(text: str, k: int, where: dict = None):
+    """Top `k` chunks by BM25, as (chunk id, Document) pairs, best first.
+
+    Each term is matched as a phrase, so identifiers like INV-2024-001 or
+    jane@example.com must appear intact. Metadata fields weigh double.
+    """
+    terms = query_terms(text)
+    if not terms:
+        return []
+    match = " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+    filter_sql, filter_params = sql_filter(where) if where else ("", [])
+    with _lock:
+        rows = _db().execute(f"""
+            SELECT c.chunk_id, c.content, c.metadata
+            FROM chunks_fts JOIN chunks c ON c.rowid = chunks_fts.rowid
+            WHERE chunks_fts MATCH ? {"AND " + filter_sql if filter_sql else ""}
+            ORDER BY bm25(chunks_fts, 2.0, 1.0)
+            LIMIT ?
+        """, (match, *filter_params, k)).fetchall()
+    return [(chunk_id, Document(page_content=content, metadata=json.loads(metadata))) for chunk_id, content, metadata in rows]
+
+def rebuild(collection, page_size: int = 1000):
+    """Repopulate the index from the Chroma collection, e.g. after an upgrade."""
+    clear()
+    offset = 0
+    while True:
+        page = collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+        if not page["ids"]:
+            return offset
+        add_chunks(page["ids"], page["documents"], page["metadatas"])
+        offset += len(page["ids"])
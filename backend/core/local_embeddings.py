@@ -0,0 +1,81 @@
+import hashlib
+import re
+import threading
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+class HashingEmbeddings(Embeddings):
+    """Feature-hashed bag of words and word bigrams, computed with NumPy.
+
+    Deterministic across processes and machines, needs no model files or
+    network, and embeds thousands of chunks per second on one core. Quality
+    sits well below a neural model; it is meant for offline indexing, tests
+    and benchmarks.
+    """
+
+    def __init__(self, dim: int = 768):
+        self.dim = dim
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        return f"hashing-{self.dim}-v1"
+
+    def _bucket(self, feature: str):
+        bucket = self._buckets.get(feature)
+        if bucket is None:
+            # blake2b rather than hash(): Python's string hash is salted per process.
+            value = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            bucket = (value % self.dim, 1.0 if value >> 63 else -1.0)
+            with self._lock:
+                if len(self._buckets) > 500_000:
+                    self._buckets.clear()
+                self._buckets[feature] = bucket
+        return bucket
+
+    def embed_documents(self, texts):
+        rows, columns, signs = [], [], []
+        for row, text in enumerate(texts):
+            tokens = _TOKEN.findall(text.lower())
+            for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+                column, sign = self._bucket(feature)
+                rows.append(row)
+                columns.append(column)
+                signs.append(sign)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        np.add.at(matrix, (np.asarray(rows, dtype=np.intp), np.asarray(columns, dtype=np.intp)), signs)
+        # Sublinear term frequency, then unit length for cosine distance.
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1.0, norms)
+        return matrix.tolist()
+
+    def embed_query(self, text: str):
+        return self.embed_documents([text])[0]
+
+class OnnxEmbeddings(Embeddings):
+    """all-MiniLM-L6-v2 on CPU through the ONNX runtime that Chroma bundles.
+
+    The model (about 80 MB) is downloaded once to Chroma's cache directory;
+    inference is batched and runs fully offline afterwards.
+    """
+
+    model = "onnx-all-MiniLM-L6-v2"
+
+    def __init__(self, batch_size: int = 32):
+        from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+
+        self.batch_size = batch_size
+        self._model = ONNXMiniLM_L6_V2()
+
+    def embed_documents(self, texts):
+        vectors = []
+        for offset in range(0, len(texts), self.batch_size):
+            vectors.extend(self._model(list(texts[offset:offset + self.batch_size])))
+        return [np.asarray(v, dtype=np.float32).tolist() for v in vectors]
+
+    def embed_query(self, text: str):
+        return self.embed_documents([text])[0]
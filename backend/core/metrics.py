@@ -0,0 +1,32 @@
+import threading
+from collections import defaultdict, deque
+
+# Rolling window of recent samples per metric, e.g. latencies in milliseconds.
+_samples = defaultdict(lambda: deque(maxlen=1000))
+_lock = threading.Lock()
+
+def observe(name: str, value: float):
+    with _lock:
+        _samples[name].append(value)
+
+def _percentile(ordered, q: float):
+    index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+def summary():
+    with _lock:
+        snapshot = {name: sorted(values) for name, values in _samples.items() if values}
+    return {
+        name: {
+            "count": len(values),
+            "mean": sum(values) / len(values),
+            "p50": _percentile(values, 0.50),
+            "p95": _percentile(values, 0.95),
+            "p99": _percentile(values, 0.99),
+        }
+        for name, values in snapshot.items()
+    }
+
+def reset():
+    with _lock:
+        _samples.clear()
@@ -0,0 +1,363 @@
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+from backend.core.keyword_index import sql_filter
+
+_INCLUDE_DEFAULT = ("metadatas", "documents")
+
+class QuantizedCollection:
+    """Memory-mapped int8 vector index with the parts of Chroma's collection API we use.
+
+    Each unit vector is stored twice: as int8 codes with a per-row scale,
+    which every query scans, and in float32, which is read only for the
+    best candidates to rescore them exactly. The scan touches a quarter of
+    the bytes a float32 scan would. Ids, text and metadata live in SQLite,
+    so `where` filters use the same SQL translation as the keyword index.
+    Deleted rows go on a free list and are reused by later adds.
+    """
+
+    def __init__(self, directory: str, name: str = "pkaa_collection", metadata: dict = None,
+                 rescore: int = 200, scan_block: int = 256):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.name = name
+        self.rescore = rescore
+        self.scan_block = scan_block
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite3"), check_same_thread=False)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS chunks (row INTEGER PRIMARY KEY, chunk_id TEXT UNIQUE NOT NULL, document TEXT, metadata TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS free_rows (row INTEGER PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+        """)
+        meta = {key: json.loads(value) for key, value in self._db.execute("SELECT name, value FROM meta")}
+        self.dim = meta.get("dim")
+        self._next_row = meta.get("next_row", 0)
+        if "collection_metadata" not in meta:
+            # Like Chroma, metadata passed in is recorded only when the collection is created.
+            self._save_meta(collection_metadata=dict(metadata or {}))
+            self._db.commit()
+        self.metadata = meta.get("collection_metadata", dict(metadata or {}))
+        self._codes = self._scales = self._vectors = None
+        self._live = np.zeros(0, dtype=bool)
+        if self.dim:
+            self._open(self._next_row)
+            rows = [row for (row,) in self._db.execute("SELECT row FROM chunks")]
+            self._live[rows] = True
+
+    def _path(self, name: str):
+        return os.path.join(self.directory, name)
+
+    def _open(self, rows: int):
+        capacity = max(rows, os.path.getsize(self._path("scales.f32")) // 4 if os.path.exists(self._path("scales.f32")) else 0)
+        if not capacity:
+            return
+        self._codes = np.memmap(self._path("codes.i8"), dtype=np.int8, mode="r+", shape=(capacity, self.dim))
+        self._scales = np.memmap(self._path("scales.f32"), dtype=np.float32, mode="r+", shape=(capacity,))
+        self._vectors = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        live = np.zeros(capacity, dtype=bool)
+        live[:len(self._live)] = self._live[:capacity]
+        self._live = live
+
+    def _ensure_capacity(self, rows: int):
+        capacity = 0 if self._scales is None else self._scales.shape[0]
+        if rows <= capacity:
+            return
+        new_capacity = max(rows, capacity * 2, 1024)
+        for array in (self._codes, self._scales, self._vectors):
+            if array is not None:
+                array.flush()
+        self._codes = self._scales = self._vectors = None
+        for name, row_bytes in (("codes.i8", self.dim), ("scales.f32", 4), ("vectors.f32", 4 * self.dim)):
+            with open(self._path(name), "ab") as f:
+                f.truncate(new_capacity * row_bytes)
+        self._open(new_capacity)
+
+    def _save_meta(self, **values):
+        self._db.executemany(
+            "INSERT OR REPLACE INTO meta VALUES (?, ?)", [(key, json.dumps(value)) for key, value in values.items()]
+        )
+
+    def modify(self, metadata: dict = None, **kwargs):
+        with self._lock:
+            self.metadata = dict(metadata or {})
+            self._save_meta(collection_metadata=self.metadata)
+            self._db.commit()
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def _rows(self, ids):
+        found = {}
+        for start in range(0, len(ids), 500):
+            batch = list(ids[start:start + 500])
+            found.update(self._db.execute(
+                f"SELECT chunk_id, row FROM chunks WHERE chunk_id IN ({','.join('?' * len(batch))})", batch
+            ).fetchall())
+        return found
+
+    def _write_vectors(self, rows, embeddings):
+        vectors = np.array(embeddings, dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+        rows = np.asarray(rows, dtype=np.intp)
+        self._vectors[rows] = vectors
+        self._scales[rows] = scales
+        self._codes[rows] = np.rint(vectors / scales[:, None]).astype(np.int8)
+
+    def upsert(self, ids, embeddings=None, documents=None, metadatas=None):
+        if not len(ids):
+            return
+        if embeddings is None:
+            raise ValueError("QuantizedCollection stores precomputed embeddings only")
+        documents = documents if documents is not None else [None] * len(ids)
+        metadatas = metadatas if metadatas is not None else [{}] * len(ids)
+        with self._lock:
+            if self.dim is None:
+                self.dim = len(embeddings[0])
+                self._save_meta(dim=self.dim)
+            existing = self._rows(ids)
+            fresh = [chunk_id for chunk_id in dict.fromkeys(ids) if chunk_id not in existing]
+            free = [row for (row,) in self._db.execute("SELECT row FROM free_rows LIMIT ?", (len(fresh),))]
+            if free:
+                self._db.executemany("DELETE FROM free_rows WHERE row = ?", [(row,) for row in free])
+            appended = list(range(self._next_row, self._next_row + len(fresh) - len(free)))
+            self._next_row += len(appended)
+            self._ensure_capacity(self._next_row)
+            existing.update(zip(fresh, free + appended))
+
+            rows = [existing[chunk_id] for chunk_id in ids]
+            self._write_vectors(rows, embeddings)
+            self._live[rows] = True
+            self._db.executemany(
+                "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?)",
+                [(row, chunk_id, document, json.dumps(metadata or {}))
+                 for row, chunk_id, document, metadata in zip(rows, ids, documents, metadatas)]
+            )
+            self._save_meta(next_row=self._next_row)
+            for array in (self._codes, self._scales, self._vectors):
+                array.flush()
+            self._db.commit()
+
+    add = upsert
+
+    def update(self, ids, embeddings=None, documents=None, metadatas=None):
+        with self._lock:
+            rows = self._rows(ids)
+            # Ids that aren't stored are skipped, as Chroma does.
+            keep = [i for i, chunk_id in enumerate(ids) if chunk_id in rows]
+            ids = [ids[i] for i in keep]
+            embeddings = None if embeddings is None else [embeddings[i] for i in keep]
+            documents = None if documents is None else [documents[i] for i in keep]
+            metadatas = None if metadatas is None else [metadatas[i] for i in keep]
+            if not ids:
+                return
+            if embeddings is not None:
+                self._write_vectors([rows[chunk_id] for chunk_id in ids], embeddings)
+                for array in (self._codes, self._scales, self._vectors):
+                    array.flush()
+            if documents is not None:
+                self._db.executemany("UPDATE chunks SET document = ? WHERE chunk_id = ?", list(zip(documents, ids)))
+            if metadatas is not None:
+                self._db.executemany(
+                    "UPDATE chunks SET metadata = ? WHERE chunk_id = ?", [(json.dumps(m or {}), i) for m, i in zip(metadatas, ids)]
+                )
+            self._db.commit()
+
+    def _select(self, columns: str, ids=None, where=None, limit=None, offset=None):
+        clauses, params = [], []
+        if ids is not None:
+            if not len(ids):
+                return []
+            clauses.append(f"c.chunk_id IN ({','.join('?' * len(ids))})")
+            params.extend(ids)
+        if where:
+            filter_sql, filter_params = sql_filter(where)
+            clauses.append(filter_sql)
+            params.extend(filter_params)
+        sql = f"SELECT {columns} FROM chunks c"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY c.row"
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([-1 if limit is None else limit, offset or 0])
+        return self._db.execute(sql, params).fetchall()
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=_INCLUDE_DEFAULT, **kwargs):
+        if isinstance(ids, str):
+            ids = [ids]
+        with self._lock:
+            if ids is not None and len(ids) > 500:
+                rows = []
+                for start in range(0, len(ids), 500):
+                    rows.extend(self._select("c.row, c.chunk_id, c.document, c.metadata", ids[start:start + 500], where))
+                rows = rows[offset or 0:None if limit is None else (offset or 0) + limit]
+            else:
+                rows = self._select("c.row, c.chunk_id, c.document, c.metadata", ids, where, limit, offset)
+            embeddings = np.array(self._vectors[[r[0] for r in rows]]) if "embeddings" in include and rows else []
+        return {
+            "ids": [r[1] for r in rows],
+            "embeddings": embeddings if "embeddings" in include else None,
+            "documents": [r[2] for r in rows] if "documents" in include else None,
+            "metadatas": [json.loads(r[3]) for r in rows] if "metadatas" in include else None,
+            "included": list(include)
+        }
+
+    def delete(self, ids=None, where=None, **kwargs):
+        if ids is None and not where:
+            return
+        with self._lock:
+            if ids is not None and len(ids) > 500:
+                for start in range(0, len(ids), 500):
+                    self.delete(ids[start:start + 500], where)
+                return
+            rows = [row for (row,) in self._select("c.row", ids, where)]
+            if not rows:
+                return
+            self._db.executemany("DELETE FROM chunks WHERE row = ?", [(row,) for row in rows])
+            self._db.executemany("INSERT OR IGNORE INTO free_rows VALUES (?)", [(row,) for row in rows])
+            self._live[rows] = False
+            self._db.commit()
+
+    def search(self, embedding, n: int, where: dict = None):
+        """Top `n` rows by cosine similarity as (rows, scores, vectors).
+
+        int8 codes are scanned in blocks to shortlist max(n, rescore)
+        candidates, whose float32 vectors are then scored exactly.
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        with self._lock:
+            if self._codes is None or not self._next_row:
+                return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.float32), np.zeros((0, len(query)), dtype=np.float32)
+            high = self._next_row
+            codes, scales = self._codes, self._scales
+            allowed = self._live[:high].copy()
+            if where:
+                mask = np.zeros(high, dtype=bool)
+                mask[[row for (row,) in self._select("c.row", where=where)]] = True
+                allowed &= mask
+
+        # The scan runs outside the lock; rows freed meanwhile are dropped below.
+        # Blocks are widened into one reused cache-sized buffer; converting
+        # the whole matrix at once would allocate 4x its size per query.
+        scores = np.full(high, -np.inf, dtype=np.float32)
+        buffer = np.empty((self.scan_block, len(query)), dtype=np.float32)
+        for start in range(0, high, self.scan_block):
+            stop = min(start + self.scan_block, high)
+            if allowed[start:stop].any():
+                block = buffer[:stop - start]
+                np.copyto(block, codes[start:stop], casting="unsafe")
+                np.dot(block, query, out=scores[start:stop])
+        scores *= scales[:high]
+        scores[~allowed] = -np.inf
+
+        shortlist = min(max(n, self.rescore), int(allowed.sum()))
+        if not shortlist:
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.float32), np.zeros((0, len(query)), dtype=np.float32)
+        candidates = np.argpartition(-scores, shortlist - 1)[:shortlist]
+        with self._lock:
+            candidates = candidates[self._live[candidates]]
+            vectors = np.array(self._vectors[np.sort(candidates)])
+        candidates = np.sort(candidates)
+        exact = vectors @ query
+        best = np.argsort(-exact)[:n]
+        return candidates[best], exact[best], vectors[best]
+
+    def query(self, query_embeddings, n_results: int = 10, where: dict = None, include=("metadatas", "documents", "distances"), **kwargs):
+        """Chroma-style nearest-neighbour query; distances are cosine distances."""
+        result = {"ids": [], "distances": [], "documents": [], "metadatas": [], "embeddings": []}
+        for embedding in query_embeddings:
+            rows, scores, vectors = self.search(embedding, n_results, where)
+            records = self.records(rows)
+            result["ids"].append([r[0] for r in records])
+            result["documents"].append([r[1] for r in records])
+            result["metadatas"].append([r[2] for r in records])
+            result["distances"].append((1.0 - scores).tolist())
+            result["embeddings"].append(vectors)
+        return result
+
+    def records(self, rows):
+        """(chunk id, document, metadata) for each row, in order."""
+        if not len(rows):
+            return []
+        with self._lock:
+            found = {row: (chunk_id, document, json.loads(metadata)) for row, chunk_id, document, metadata in self._db.execute(
+                f"SELECT row, chunk_id, document, metadata FROM chunks WHERE row IN ({','.join('?' * len(rows))})",
+                [int(row) for row in rows]
+            )}
+        return [found[int(row)] for row in rows if int(row) in found]
+
+    def drop(self):
+        with self._lock:
+            self._codes = self._scales = self._vectors = None
+            self._db.close()
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+class QuantizedVectorStore(VectorStore):
+    """LangChain vector store over a QuantizedCollection, standing in for Chroma."""
+
+    def __init__(self, directory: str, embedding_function, collection_metadata: dict = None,
+                 rescore: int = 200, scan_block: int = 256):
+        self._embedding_function = embedding_function
+        self._collection = QuantizedCollection(directory, metadata=collection_metadata, rescore=rescore, scan_block=scan_block)
+
+    @property
+    def embeddings(self):
+        return self._embedding_function
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        import uuid
+
+        texts = list(texts)
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        self._collection.upsert(ids, self._embedding_function.embed_documents(texts), texts, metadatas)
+        return ids
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, directory: str = "./quantized_index", **kwargs):
+        store = cls(directory, embedding)
+        store.add_texts(texts, metadatas, ids)
+        return store
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=_INCLUDE_DEFAULT, **kwargs):
+        return self._collection.get(ids=ids, where=where, limit=limit, offset=offset, include=include)
+
+    def delete(self, ids=None, **kwargs):
+        self._collection.delete(ids=ids)
+
+    def delete_collection(self):
+        self._collection.drop()
+
+    def _documents(self, rows):
+        return [Document(page_content=document or "", metadata=metadata) for _, document, metadata in self._collection.records(rows)]
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, filter: dict = None, **kwargs):
+        rows, _, _ = self._collection.search(embedding, k, filter)
+        return self._documents(rows)
+
+    def similarity_search(self, query: str, k: int = 4, filter: dict = None, **kwargs):
+        return self.similarity_search_by_vector(self._embedding_function.embed_query(query), k, filter)
+
+    def max_marginal_relevance_search_by_vector(self, embedding, k: int = 4, fetch_k: int = 20,
+                                                lambda_mult: float = 0.5, filter: dict = None, **kwargs):
+        rows, _, vectors = self._collection.search(embedding, fetch_k, filter)
+        if not len(rows):
+            return []
+        selected = maximal_marginal_relevance(np.asarray(embedding, dtype=np.float32), vectors, k=k, lambda_mult=lambda_mult)
+        # Like Chroma, keep the selection in similarity order.
+        return self._documents(rows[sorted(selected)])
+
+    def max_marginal_relevance_search(self, query: str, k: int = 4, fetch_k: int = 20,
+                                      lambda_mult: float = 0.5, filter: dict = None, **kwargs):
+        return self.max_marginal_relevance_search_by_vector(
+            self._embedding_function.embed_query(query), k, fetch_k, lambda_mult, filter
+        )
@@ -1,11 +1,22 @@
+import asyncio
 import os
+import re
+import time
 import streamlit as st
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.chains import ConversationalRetrievalChain
-from langchain.memory import ConversationBufferMemory
+from langchain.chains.conversational_retrieval.base import _get_chat_history
 from langchain_core.prompts import ChatPromptTemplate, SystemMessagePromptTemplate, HumanMessagePromptTemplate
 from langchain.retrievers.multi_query import MultiQueryRetriever
-from backend.core.vector_store import get_vector_store
+from backend.core.vector_store import get_vector_store, get_embeddings, ensure_keyword_index
+from backend.core.snapshot import restore_if_empty
+from backend.core.answer_cache import get_answer_cache, normalize_question
+from backend.core.retrieval import retrieve, aretrieve, keyword_documents, lexical_only
+from backend.core.reranker import candidate_pool, select_context
+from backend.core import registry, metrics
+from backend.core.config import get_setting, get_bool
+from backend.core.keyword_index import query_terms
+from backend.core.session_memory import DEFAULT_SESSION, estimate_tokens, get_session_store
 
 system_template = """You are a personal knowledge AI assistant. Only answer using the retrieved context. If the answer is not present, say 'Information not found in your data.' Do not fabricate information.
 
@@ -17,49 +28,270 @@ messages = [
 ]
 qa_prompt = ChatPromptTemplate.from_messages(messages)
 
-user_memory = ConversationBufferMemory(
-    memory_key="chat_history",
-    return_messages=True,
-    output_key="answer"
-)
-
-def get_rag_chain():
+def _create_llm():
     api_key = st.secrets.get("GOOGLE_API_KEY", os.environ.get("GOOGLE_API_KEY"))
     if not api_key:
         raise ValueError("Missing GOOGLE_API_KEY")
 
+    return ChatGoogleGenerativeAI(
+        model="gemini-2.0-flash",
+        temperature=0,
+        google_api_key=api_key
+    )
+
+def _create_rag_chain():
+    llm = get_llm()
+    vector_store = get_vector_store()
+
+    retriever = vector_store.as_retriever(search_type="mmr", search_kwargs={"k": 5})
+
+    return ConversationalRetrievalChain.from_llm(
+        llm=llm,
+        retriever=retriever,
+        return_source_documents=True,
+        combine_docs_chain_kwargs={"prompt": qa_prompt},
+        # Verbose chains log every full prompt on the request path.
+        verbose=get_bool("RAG_VERBOSE", False)
+    )
+
+def get_llm():
+    return registry.get_or_create("llm", _create_llm)
+
+def get_rag_chain():
     try:
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash",
-            temperature=0,
-            google_api_key=api_key
-        )
-        vector_store = get_vector_store()
-        
-        retriever = vector_store.as_retriever(search_type="mmr", search_kwargs={"k": 5})
-        
-        chain = ConversationalRetrievalChain.from_llm(
-            llm=llm,
-            retriever=retriever,
-            memory=user_memory,
-            return_source_documents=True,
-            combine_docs_chain_kwargs={"prompt": qa_prompt},
-            verbose=True
-        )
-        return chain
+        return registry.get_or_create("rag_chain", _create_rag_chain)
     except Exception as e:
         st.error(f"Failed to initialize RAG chain: {str(e)}")
         raise e
 
-def query_rag(query: str):
+def warm_up():
+    """Build the embedder, vector store, LLM client and chain ahead of the first request."""
+    get_vector_store()
+    restore_if_empty()
+    ensure_keyword_index()
+    get_rag_chain()
+
+QUOTA_MESSAGE = "⚠️ **Quota Exceeded:** You have reached the API limit for today (20 requests/day on the current tier). Please try again tomorrow or check your plan in Google AI Studio."
+
+def _is_quota_error(e: Exception):
+    return "429" in str(e) or "quota" in str(e).lower()
+
+# Words and openers that lean on earlier turns ("what about its price?").
+_FOLLOW_UP = re.compile(
+    r"\b(it|its|it's|this|that|these|those|they|them|their|he|him|his|she|her|there|"
+    r"above|previous|earlier|same|former|latter|else|more|again)\b"
+    r"|^(and|also|but|so|then|what about|how about|why|how come|ok|okay)\b",
+    re.IGNORECASE
+)
+
+def is_follow_up(question: str):
+    """Cheap check for questions that only make sense with the conversation so far."""
+    return len(question.split()) < 4 or bool(_FOLLOW_UP.search(question.strip()))
+
+def _history(session_id: str):
+    messages = get_session_store().history(session_id)
+    history = _get_chat_history(messages)
+    metrics.observe("chat_history_tokens", estimate_tokens(history))
+    return messages, history
+
+def _condense_mode(question: str, messages):
+    """How to make `question` standalone: None (use as is), "local" or "llm".
+
+    CONDENSE_MODE=auto (default) calls the LLM only for apparent follow-ups,
+    llm always calls it once there is history, local rewrites follow-ups
+    without any LLM call, and off never condenses.
+    """
+    mode = get_setting("CONDENSE_MODE", "auto")
+    if not messages or mode == "off":
+        return None
+    if mode == "llm":
+        return "llm"
+    if not is_follow_up(question):
+        return None
+    return "local" if mode == "local" else "llm"
+
+def _local_rewrite(question: str, messages):
+    # Carry over the key terms of the last question the user asked.
+    previous = next((m.content for m in reversed(messages) if m.type == "human"), "")
+    current = set(query_terms(question))
+    carried = [term for term in query_terms(previous) if term not in current][:8]
+    return f"{question} {' '.join(carried)}" if carried else question
+
+def _standalone_question(chain, question: str, messages, history: str):
+    mode = _condense_mode(question, messages)
+    if mode is None:
+        return question
+    if mode == "local":
+        return _local_rewrite(question, messages)
+    start = time.perf_counter()
+    question = chain.question_generator.invoke({"question": question, "chat_history": history})["text"]
+    metrics.observe("chat_condense_ms", (time.perf_counter() - start) * 1000)
+    return question
+
+async def _astandalone_question(chain, question: str, messages, history: str):
+    mode = _condense_mode(question, messages)
+    if mode is None:
+        return question
+    if mode == "local":
+        return _local_rewrite(question, messages)
+    start = time.perf_counter()
+    question = (await chain.question_generator.ainvoke({"question": question, "chat_history": history}))["text"]
+    metrics.observe("chat_condense_ms", (time.perf_counter() - start) * 1000)
+    return question
+
+def _answer_prompt(docs, question: str):
+    return qa_prompt.format_messages(
+        context="\n\n".join(doc.page_content for doc in docs),
+        question=question
+    )
+
+def _elapsed_ms(since: float):
+    return (time.perf_counter() - since) * 1000
+
+def _rerank(question: str, docs, k: int):
+    start = time.perf_counter()
+    docs = select_context(question, docs, k)
+    return docs, _elapsed_ms(start)
+
+def _finish(session_id: str, query: str, answer: str, start: float, ttft_ms, cached: bool = False, timings=None):
+    get_session_store().save(session_id, query, answer)
+    timings = dict(timings or {}, total_ms=_elapsed_ms(start))
+    for name, value in timings.items():
+        metrics.observe(f"chat_{name}", value)
+    return {"type": "done", "metrics": {"ttft_ms": ttft_ms, "cached": cached, **timings}}
+
+def _cached_events(entry, session_id: str, query: str, start: float):
+    ttft_ms = _elapsed_ms(start)
+    metrics.observe("chat_ttft_ms", ttft_ms)
+    yield {"type": "sources", "documents": entry["documents"]}
+    yield {"type": "token", "text": entry["answer"]}
+    yield _finish(session_id, query, entry["answer"], start, ttft_ms, cached=True)
+
+def _run_rag(query: str, session_id: str, where: dict = None):
+    """Condense, retrieve and generate, yielding events as they become available.
+
+    Events are dicts: {"type": "sources", "documents": [...]}, then one
+    {"type": "token", "text": ...} per streamed LLM chunk, then
+    {"type": "done", "metrics": {...}}.
+    """
+    start = time.perf_counter()
+    chain = get_rag_chain()
+    messages, history = _history(session_id)
+
+    question = _standalone_question(chain, query, messages, history)
+    k = chain.retriever.search_kwargs["k"]
+    # Retrieval gathers a wider pool; the reranker narrows it to what the
+    # prompt gets.
+    pool = candidate_pool(k)
+    cache = get_answer_cache()
+    question_embedding = None
+    retrieval_start = time.perf_counter()
+    # Identifier lookups are served by the keyword index without embedding.
+    docs = keyword_documents(question, pool, where) if lexical_only(question) else []
+    if not docs:
+        # One embedding serves both the answer cache lookup and retrieval.
+        question_embedding = get_embeddings().embed_query(normalize_question(question))
+        entry = cache.lookup(question_embedding, where) if cache is not None else None
+        if entry is not None:
+            yield from _cached_events(entry, session_id, query, start)
+            return
+        docs = retrieve(get_vector_store(), question, question_embedding, dict(chain.retriever.search_kwargs, k=pool), where)
+    timings = {"retrieval_ms": _elapsed_ms(retrieval_start)}
+    docs, timings["rerank_ms"] = _rerank(question, docs, k)
+    yield {"type": "sources", "documents": docs}
+
+    answer = ""
+    ttft_ms = None
+    generation_start = time.perf_counter()
+    for chunk in get_llm().stream(_answer_prompt(docs, question)):
+        if ttft_ms is None:
+            ttft_ms = _elapsed_ms(start)
+            metrics.observe("chat_ttft_ms", ttft_ms)
+        answer += chunk.content
+        yield {"type": "token", "text": chunk.content}
+    timings["generation_ms"] = _elapsed_ms(generation_start)
+
+    if cache is not None and question_embedding is not None and answer:
+        cache.store(question_embedding, answer, docs, where)
+    yield _finish(session_id, query, answer, start, ttft_ms, timings=timings)
+
+async def _arun_rag(query: str, session_id: str, where: dict = None):
+    """Async twin of `_run_rag`; never blocks the event loop on network calls."""
+    start = time.perf_counter()
+    chain = get_rag_chain()
+    messages, history = _history(session_id)
+
+    question = await _astandalone_question(chain, query, messages, history)
+    k = chain.retriever.search_kwargs["k"]
+    pool = candidate_pool(k)
+    cache = get_answer_cache()
+    question_embedding = None
+    loop = asyncio.get_running_loop()
+    retrieval_start = time.perf_counter()
+    docs = []
+    if lexical_only(question):
+        docs = await loop.run_in_executor(None, keyword_documents, question, pool, where)
+    if not docs:
+        question_embedding = await get_embeddings().aembed_query(normalize_question(question))
+        entry = cache.lookup(question_embedding, where) if cache is not None else None
+        if entry is not None:
+            for event in _cached_events(entry, session_id, query, start):
+                yield event
+            return
+        docs = await aretrieve(get_vector_store(), question, question_embedding, dict(chain.retriever.search_kwargs, k=pool), where)
+    timings = {"retrieval_ms": _elapsed_ms(retrieval_start)}
+    # A cross-encoder is CPU-bound, so it runs off the event loop.
+    docs, timings["rerank_ms"] = await loop.run_in_executor(None, _rerank, question, docs, k)
+    yield {"type": "sources", "documents": docs}
+
+    answer = ""
+    ttft_ms = None
+    generation_start = time.perf_counter()
+    async for chunk in get_llm().astream(_answer_prompt(docs, question)):
+        if ttft_ms is None:
+            ttft_ms = _elapsed_ms(start)
+            metrics.observe("chat_ttft_ms", ttft_ms)
+        answer += chunk.content
+        yield {"type": "token", "text": chunk.content}
+    timings["generation_ms"] = _elapsed_ms(generation_start)
+
+    if cache is not None and question_embedding is not None and answer:
+        cache.store(question_embedding, answer, docs, where)
+    yield _finish(session_id, query, answer, start, ttft_ms, timings=timings)
+
+def stream_rag(query: str, session_id: str = DEFAULT_SESSION, where: dict = None):
     try:
-        chain = get_rag_chain()
-        response = chain.invoke({"question": query})
-        return response
+        yield from _run_rag(query, session_id, where)
     except Exception as e:
-        if "429" in str(e) or "quota" in str(e).lower():
-            return {
-                "answer": "⚠️ **Quota Exceeded:** You have reached the API limit for today (20 requests/day on the current tier). Please try again tomorrow or check your plan in Google AI Studio.",
-                "source_documents": []
-            }
-        raise e
+        if not _is_quota_error(e):
+            raise e
+        yield {"type": "token", "text": QUOTA_MESSAGE}
+        yield {"type": "done", "metrics": {}}
+
+def query_rag(query: str, session_id: str = DEFAULT_SESSION, where: dict = None):
+    answer, docs = "", []
+    for event in stream_rag(query, session_id, where):
+        if event["type"] == "sources":
+            docs = event["documents"]
+        elif event["type"] == "token":
+            answer += event["text"]
+    return {"answer": answer, "source_documents": docs}
+
+async def astream_rag(query: str, session_id: str = DEFAULT_SESSION, where: dict = None):
+    try:
+        async for event in _arun_rag(query, session_id, where):
+            yield event
+    except Exception as e:
+        if not _is_quota_error(e):
+            raise e
+        yield {"type": "token", "text": QUOTA_MESSAGE}
+        yield {"type": "done", "metrics": {}}
+
+async def aquery_rag(query: str, session_id: str = DEFAULT_SESSION, where: dict = None):
+    answer, docs = "", []
+    async for event in astream_rag(query, session_id, where):
+        if event["type"] == "sources":
+            docs = event["documents"]
+        elif event["type"] == "token":
+            answer += event["text"]
+    return {"answer": answer, "source_documents": docs}
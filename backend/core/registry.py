@@ -0,0 +1,32 @@
+import threading
+
+# Process-wide cache of long-lived clients (embedder, vector store, LLM, chain).
+# Factories run at most once per name until the entry is invalidated.
+_objects = {}
+_lock = threading.RLock()
+
+def get_or_create(name: str, factory):
+    obj = _objects.get(name)
+    if obj is not None:
+        return obj
+    with _lock:
+        obj = _objects.get(name)
+        if obj is None:
+            obj = factory()
+            _objects[name] = obj
+        return obj
+
+def register(name: str, obj):
+    with _lock:
+        _objects[name] = obj
+
+def invalidate(*names: str):
+    with _lock:
+        if not names:
+            _objects.clear()
+        for name in names:
+            _objects.pop(name, None)
+
+def cached_names():
+    with _lock:
+        return list(_objects)
@@ -0,0 +1,119 @@
+import hashlib
+import logging
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from backend.core import registry
+from backend.core.config import get_setting, get_int
+from backend.core.keyword_index import KEYWORD_FIELDS, query_terms
+from backend.core.session_memory import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+class LexicalReranker:
+    """BM25-style term overlap between the question and each candidate.
+
+    IDF comes from the candidate pool itself, so the scorer needs no corpus
+    statistics and costs microseconds per chunk. Matches in subject, sender
+    or filename count double. The incoming rank is kept as a small prior so
+    retrieval order breaks ties.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+
+    def score(self, question: str, docs):
+        terms = query_terms(question)
+        if not terms or not docs:
+            return [0.0] * len(docs)
+        tokenized = []
+        for doc in docs:
+            fields = " ".join(str(doc.metadata[key]) for key in KEYWORD_FIELDS if doc.metadata.get(key))
+            tokens = re.findall(r"\w+(?:[-@.'_/]\w+)*", doc.page_content.lower())
+            tokens += re.findall(r"\w+(?:[-@.'_/]\w+)*", fields.lower()) * 2
+            tokenized.append(Counter(tokens))
+        avg_len = sum(sum(c.values()) for c in tokenized) / len(tokenized) or 1.0
+        df = Counter(term for counts in tokenized for term in terms if term in counts)
+        scores = []
+        for rank, counts in enumerate(tokenized):
+            length = sum(counts.values())
+            score = 0.0
+            for term in terms:
+                tf = counts.get(term, 0)
+                if tf:
+                    idf = math.log(1 + (len(docs) - df[term] + 0.5) / (df[term] + 0.5))
+                    score += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avg_len))
+            scores.append(score + 1.0 / (60 + rank + 1))
+        return scores
+
+class CrossEncoderReranker:
+    """Local sentence-transformers cross-encoder, scored in batches.
+
+    Scores are cached per (question, chunk) so follow-ups and repeated
+    questions skip the model for chunks they have already seen.
+    """
+
+    def __init__(self, model_name: str, batch_size: int, cache_size: int):
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_name, device="cpu")
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def score(self, question: str, docs):
+        keys = [hashlib.sha256(f"{question}\0{doc.page_content}".encode("utf-8")).hexdigest() for doc in docs]
+        with self._lock:
+            scores = {key: self._cache[key] for key in keys if key in self._cache}
+        missing = [(key, doc) for key, doc in zip(keys, docs) if key not in scores]
+        if missing:
+            predicted = self.model.predict(
+                [(question, doc.page_content) for _, doc in missing],
+                batch_size=self.batch_size
+            )
+            with self._lock:
+                for (key, _), value in zip(missing, predicted):
+                    scores[key] = self._cache[key] = float(value)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return [scores[key] for key in keys]
+
+def _create_reranker():
+    kind = get_setting("RERANKER", "lexical")
+    if kind == "off":
+        return None
+    if kind == "cross-encoder":
+        try:
+            return CrossEncoderReranker(
+                get_setting("RERANKER_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"),
+                batch_size=get_int("RERANKER_BATCH_SIZE", 32),
+                cache_size=get_int("RERANKER_CACHE_SIZE", 10_000)
+            )
+        except ImportError:
+            logger.warning("RERANKER=cross-encoder needs sentence-transformers, which is not installed; using the lexical reranker")
+    return LexicalReranker()
+
+def get_reranker():
+    return registry.get_or_create("reranker", _create_reranker)
+
+def candidate_pool(k: int):
+    return max(k, get_int("RERANK_CANDIDATES", 20)) if get_reranker() is not None else k
+
+def select_context(question: str, docs, k: int):
+    """Rerank candidates and keep the best `k` that fit CONTEXT_TOKEN_BUDGET."""
+    reranker = get_reranker()
+    if reranker is not None and len(docs) > 1:
+        scores = reranker.score(question, docs)
+        docs = [doc for _, doc in sorted(zip(scores, docs), key=lambda pair: pair[0], reverse=True)]
+    budget = get_int("CONTEXT_TOKEN_BUDGET", 1500)
+    selected, used = [], 0
+    for doc in docs[:k]:
+        tokens = estimate_tokens(doc.page_content)
+        if selected and used + tokens > budget:
+            break
+        selected.append(doc)
+        used += tokens
+    return selected
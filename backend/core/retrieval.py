@@ -0,0 +1,92 @@
+import asyncio
+import hashlib
+import re
+from backend.core import keyword_index
+from backend.core.indexing import to_epoch
+from backend.core.config import get_setting, get_int
+
+RRF_K = 60
+
+# Identifiers: invoice numbers, addresses, filenames, ticket keys.
+_IDENTIFIER = re.compile(r"^(?=.*[\d@_./-])[\w@./#-]+$|^[A-Z]{2,}[\w-]*$")
+
+def is_lexical_query(question: str):
+    """Quoted queries and bare identifiers are answered from the keyword index alone."""
+    question = question.strip().rstrip("?")
+    if len(question) > 2 and question[0] == question[-1] and question[0] in "\"'":
+        return True
+    words = question.split()
+    return 0 < len(words) <= 4 and all(_IDENTIFIER.match(word) for word in words)
+
+def build_where(source_types=None, sources=None, senders=None, date_from=None, date_to=None, ingested_before=None):
+    """Chroma `where` clause for chat filters, or None to search everything.
+
+    Dates may be ISO strings or epoch seconds and compare against the
+    date_epoch field written at ingest (ingested_before against
+    ingested_epoch); senders match sender_email.
+    """
+    clauses = []
+    for field, values in (("source_type", source_types), ("source", sources), ("sender_email", senders)):
+        if values:
+            values = [v.lower() for v in values] if field == "sender_email" else list(values)
+            clauses.append({field: {"$in": values}})
+    for field, operator, value in (("date_epoch", "$gte", date_from), ("date_epoch", "$lte", date_to), ("ingested_epoch", "$lt", ingested_before)):
+        if value is not None:
+            epoch = to_epoch(value)
+            if epoch is None:
+                raise ValueError(f"Unrecognized date: {value}")
+            clauses.append({field: {operator: epoch}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def _doc_key(doc):
+    return hashlib.sha256(f"{doc.metadata.get('source', '')}\0{doc.page_content}".encode("utf-8")).hexdigest()
+
+def fuse(rankings, k: int):
+    """Reciprocal rank fusion of several best-first document lists."""
+    scores, docs = {}, {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            key = _doc_key(doc)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)[:k]]
+
+def keyword_documents(question: str, k: int, where: dict = None):
+    return [doc for _, doc in keyword_index.search(question.strip("\"' ?"), k, where)]
+
+def _hybrid():
+    return get_setting("RETRIEVAL_MODE", "hybrid") == "hybrid"
+
+def _candidates(k: int):
+    return max(k, get_int("RETRIEVAL_CANDIDATES", 2 * k))
+
+def _vector_kwargs(search_kwargs: dict, k: int, where: dict):
+    # MMR picks k of fetch_k nearest neighbours; a wide pool needs fetch_k >= k.
+    kwargs = dict(search_kwargs, k=k, fetch_k=max(search_kwargs.get("fetch_k", 20), k))
+    if where:
+        kwargs["filter"] = where
+    return kwargs
+
+def retrieve(vector_store, question: str, embedding, search_kwargs: dict, where: dict = None):
+    k = search_kwargs.get("k", 4)
+    vector_docs = vector_store.max_marginal_relevance_search_by_vector(
+        embedding, **_vector_kwargs(search_kwargs, _candidates(k) if _hybrid() else k, where)
+    )
+    if not _hybrid():
+        return vector_docs
+    return fuse([vector_docs, keyword_documents(question, _candidates(k), where)], k)
+
+async def aretrieve(vector_store, question: str, embedding, search_kwargs: dict, where: dict = None):
+    k = search_kwargs.get("k", 4)
+    if not _hybrid():
+        return await vector_store.amax_marginal_relevance_search_by_vector(embedding, **_vector_kwargs(search_kwargs, k, where))
+    vector_docs, lexical_docs = await asyncio.gather(
+        vector_store.amax_marginal_relevance_search_by_vector(embedding, **_vector_kwargs(search_kwargs, _candidates(k), where)),
+        asyncio.get_running_loop().run_in_executor(None, keyword_documents, question, _candidates(k), where)
+    )
+    return fuse([vector_docs, lexical_docs], k)
+
+def lexical_only(question: str):
+    return _hybrid() and is_lexical_query(question)
@@ -0,0 +1,109 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from backend.core import registry
+from backend.core.config import get_int
+
+DEFAULT_SESSION = "default"
+
+def estimate_tokens(text: str):
+    # Roughly four characters per token for English; good enough for budgeting.
+    return (len(text) + 3) // 4
+
+def _first_sentence(text: str, max_chars: int = 160):
+    text = " ".join(text.split())
+    sentence = re.split(r"(?<=[.!?])\s", text, maxsplit=1)[0]
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars].rstrip() + "…"
+
+class _Session:
+    __slots__ = ("turns", "summary", "last_used")
+
+    def __init__(self):
+        self.turns = []
+        self.summary = []
+        self.last_used = time.monotonic()
+
+    def tokens(self):
+        return sum(estimate_tokens(q) + estimate_tokens(a) for q, a in self.turns) + \
+            sum(estimate_tokens(line) for line in self.summary)
+
+class SessionStore:
+    """Conversation history per session id.
+
+    Sessions are kept in LRU order and expire after `ttl` seconds idle. Each
+    session stays within `token_budget`: once its turns outgrow the budget,
+    the oldest are folded into a running extractive summary (first sentence
+    of question and answer) so condensing prompts stay flat as a
+    conversation grows, without spending an LLM call on summarizing.
+    """
+
+    def __init__(self, max_sessions: int, ttl: float, token_budget: int, summary_budget: int):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_sessions and now - session.last_used <= self.ttl:
+                return
+            del self._sessions[session_id]
+
+    def _get(self, session_id: str, create: bool):
+        now = time.monotonic()
+        self._evict(now)
+        session = self._sessions.get(session_id)
+        if session is None:
+            if not create:
+                return None
+            session = self._sessions[session_id] = _Session()
+        self._sessions.move_to_end(session_id)
+        session.last_used = now
+        return session
+
+    def history(self, session_id: str):
+        """Chat history as messages, summary first, for the question condenser."""
+        with self._lock:
+            session = self._get(session_id, create=False)
+            if session is None:
+                return []
+            messages = []
+            if session.summary:
+                messages.append(SystemMessage(content="Earlier in this conversation: " + " ".join(session.summary)))
+            for question, answer in session.turns:
+                messages.extend([HumanMessage(content=question), AIMessage(content=answer)])
+            return messages
+
+    def save(self, session_id: str, question: str, answer: str):
+        with self._lock:
+            session = self._get(session_id, create=True)
+            session.turns.append((question, answer))
+            # Always keep the latest turn verbatim; follow-ups refer to it most.
+            while len(session.turns) > 1 and session.tokens() > self.token_budget:
+                old_q, old_a = session.turns.pop(0)
+                session.summary.append(f"Asked: {_first_sentence(old_q)} Answered: {_first_sentence(old_a)}")
+                while len(session.summary) > 1 and \
+                        sum(estimate_tokens(line) for line in session.summary) > self.summary_budget:
+                    session.summary.pop(0)
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        with self._lock:
+            self._evict(time.monotonic())
+            return len(self._sessions)
+
+def get_session_store():
+    return registry.get_or_create("chat_sessions", lambda: SessionStore(
+        max_sessions=get_int("CHAT_MAX_SESSIONS", 1000),
+        ttl=get_int("CHAT_SESSION_TTL_SECONDS", 3600),
+        token_budget=get_int("CHAT_HISTORY_TOKEN_BUDGET", 1000),
+        summary_budget=get_int("CHAT_SUMMARY_TOKEN_BUDGET", 250)
+    ))
@@ -0,0 +1,286 @@
+import argparse
+import itertools
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+from datetime import datetime, timezone
+import numpy as np
+from backend.core import keyword_index, registry
+from backend.core.sync_state import all_state, replace_state
+from backend.core.config import get_setting, get_int, get_bool
+from backend.core.vector_store import get_vector_store, embedding_model_id, wipe_vector_store, vector_store_directory
+
+# A snapshot is a directory holding vectors.npy (one row per chunk, float32
+# or float16, memory-mappable), records.jsonl (one [id, document, metadata]
+# line per chunk, in vector row order) and manifest.json, which is written
+# last: a directory without a manifest is incomplete and ignored. Format 1
+# kept text and metadata column by column in columns.json; it still loads.
+# sync_state.json holds the sync cursors taken as the export began; older
+# snapshots lack it.
+FORMAT_VERSION = 2
+MANIFEST = "manifest.json"
+VECTORS = "vectors.npy"
+RECORDS = "records.jsonl"
+COLUMNS = "columns.json"
+SYNC_STATE = "sync_state.json"
+
+_lock = threading.RLock()
+
+def snapshot_root():
+    return get_setting("SNAPSHOT_DIR", "./snapshots")
+
+def _dir_size(path: str):
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+def list_snapshots():
+    """Complete snapshots as (path, manifest) pairs, newest first."""
+    root = snapshot_root()
+    if not os.path.isdir(root):
+        return []
+    found = []
+    for name in sorted(os.listdir(root), reverse=True):
+        manifest_path = os.path.join(root, name, MANIFEST)
+        if not name.startswith(".") and os.path.isfile(manifest_path):
+            with open(manifest_path) as f:
+                found.append((os.path.join(root, name), json.load(f)))
+    return found
+
+def _prune(keep: int):
+    for path, _ in list_snapshots()[keep:]:
+        shutil.rmtree(path, ignore_errors=True)
+
+def create_snapshot(dtype: str = None, progress=None):
+    """Export the collection to a new snapshot directory and return its path.
+
+    Vectors are copied page by page straight into a memory-mapped .npy file;
+    nothing is re-embedded. Only SNAPSHOT_KEEP snapshots are kept.
+    """
+    dtype = np.dtype(dtype or get_setting("SNAPSHOT_DTYPE", "float32"))
+    if dtype not in (np.float32, np.float16):
+        raise ValueError(f"Unsupported snapshot dtype: {dtype}")
+    page_size = get_int("SNAPSHOT_BATCH_SIZE", 1000)
+    root = snapshot_root()
+    os.makedirs(root, exist_ok=True)
+
+    with _lock:
+        collection = get_vector_store()._collection
+        total = collection.count()
+        name = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        while os.path.exists(os.path.join(root, name)):
+            name += "_"
+        partial = os.path.join(root, f".{name}.partial")
+        shutil.rmtree(partial, ignore_errors=True)
+        os.makedirs(partial)
+        # Taken before the export, so cursors never run ahead of the chunks.
+        with open(os.path.join(partial, SYNC_STATE), "w") as f:
+            json.dump(all_state(), f)
+
+        # Text and metadata are streamed out a page at a time next to the
+        # vectors, so memory stays flat however large the collection is.
+        count = 0
+        vectors = None
+        with open(os.path.join(partial, RECORDS), "w") as records:
+            while count < total:
+                page = collection.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=count)
+                if not page["ids"]:
+                    break
+                # Chunks added mid-export past the initial count wait for the next snapshot.
+                rows = min(len(page["ids"]), total - count)
+                embeddings = np.asarray(page["embeddings"][:rows], dtype=np.float32)
+                if vectors is None:
+                    vectors = np.lib.format.open_memmap(
+                        os.path.join(partial, VECTORS), mode="w+", dtype=dtype, shape=(total, embeddings.shape[1])
+                    )
+                vectors[count:count + rows] = embeddings
+                for chunk_id, document, metadata in zip(page["ids"][:rows], page["documents"][:rows], page["metadatas"][:rows]):
+                    records.write(json.dumps([chunk_id, document, metadata or {}]) + "\n")
+                count += rows
+                if progress:
+                    progress(chunks=rows)
+
+        if vectors is None:
+            np.save(os.path.join(partial, VECTORS), np.zeros((0, 0), dtype=dtype))
+            dim = 0
+        else:
+            vectors.flush()
+            dim = vectors.shape[1]
+            del vectors
+
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "name": name,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "collection": collection.name,
+            "embedding_model": embedding_model_id(),
+            "count": count,
+            "dim": dim,
+            "dtype": dtype.name,
+            "bytes": _dir_size(partial)
+        }
+        with open(os.path.join(partial, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+        path = os.path.join(root, name)
+        os.replace(partial, path)
+        _prune(max(1, get_int("SNAPSHOT_KEEP", 3)))
+        return path
+
+def _iter_records(path: str, manifest: dict):
+    if manifest["format_version"] == 1:
+        with open(os.path.join(path, COLUMNS)) as f:
+            columns = json.load(f)
+        metadata = columns["metadata"]
+        for row, (chunk_id, document) in enumerate(zip(columns["ids"], columns["documents"])):
+            yield chunk_id, document, {key: values[row] for key, values in metadata.items() if values[row] is not None}
+        return
+    with open(os.path.join(path, RECORDS)) as f:
+        for line in f:
+            yield tuple(json.loads(line))
+
+def load_snapshot(path: str):
+    """(manifest, memory-mapped vectors, iterator of (id, document, metadata)) for the snapshot at `path`."""
+    with open(os.path.join(path, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest["format_version"] > FORMAT_VERSION:
+        raise ValueError(f"Snapshot format {manifest['format_version']} is newer than this version supports")
+    vectors = np.load(os.path.join(path, VECTORS), mmap_mode="r")
+    return manifest, vectors, _iter_records(path, manifest)
+
+def restore_snapshot(path: str = None, progress=None):
+    """Replace the collection and keyword index with a snapshot (newest by default).
+
+    Sync cursors are reset to the ones saved with the snapshot, so the next
+    sync picks up whatever changed since it was taken; a snapshot without
+    them leaves the current cursors alone.
+    """
+    with _lock:
+        if path is None:
+            snapshots = list_snapshots()
+            if not snapshots:
+                raise FileNotFoundError(f"No snapshots in {snapshot_root()}")
+            path = snapshots[0][0]
+        manifest, vectors, records = load_snapshot(path)
+        model = embedding_model_id()
+        if manifest["embedding_model"] != model:
+            raise RuntimeError(
+                f"Snapshot {manifest['name']} holds vectors from {manifest['embedding_model']} "
+                f"but EMBEDDING_BACKEND selects {model}."
+            )
+
+        wipe_vector_store(clear_sync_state=False)
+        collection = get_vector_store()._collection
+        page_size = get_int("SNAPSHOT_BATCH_SIZE", 1000)
+        for start in range(0, manifest["count"], page_size):
+            stop = min(start + page_size, manifest["count"])
+            ids, documents, metadatas = zip(*itertools.islice(records, stop - start))
+            ids, documents, metadatas = list(ids), list(documents), list(metadatas)
+            collection.add(
+                ids=ids,
+                embeddings=np.asarray(vectors[start:stop], dtype=np.float32),
+                documents=documents,
+                metadatas=metadatas
+            )
+            keyword_index.add_chunks(ids, documents, metadatas)
+            if progress:
+                progress(chunks=len(ids))
+        state_path = os.path.join(path, SYNC_STATE)
+        if os.path.exists(state_path):
+            with open(state_path) as f:
+                replace_state(json.load(f))
+        return manifest["count"]
+
+def restore_if_empty():
+    """Reload the newest compatible snapshot into an empty collection at start-up."""
+    # Off by default: after a deliberate wipe, a restart must not bring the corpus back.
+    if not get_bool("SNAPSHOT_RESTORE_ON_START", False):
+        return 0
+    if get_vector_store()._collection.count():
+        return 0
+    model = embedding_model_id()
+    for path, manifest in list_snapshots():
+        if manifest["embedding_model"] == model and manifest["count"]:
+            return restore_snapshot(path)
+    return 0
+
+def purge_dropped_segments(persist_directory: str = None):
+    """Remove what Chroma leaves behind when a collection is deleted.
+
+    Chroma 0.6 drops the segment records but keeps their embedding rows,
+    metadata, full-text entries and HNSW directories, so every wipe, restore
+    or compaction leaves a full copy of the old index on disk. This edits
+    Chroma's private SQLite schema directly, so it is offline only: run it
+    from the CLI while the app is stopped, never next to an open client.
+    """
+    if "vector_store" in registry.cached_names():
+        raise RuntimeError("The vector store is open in this process; purge only runs offline")
+    persist_directory = persist_directory or vector_store_directory()
+    db_path = os.path.join(persist_directory, "chroma.sqlite3")
+    if not os.path.exists(db_path):
+        return 0
+    before = _dir_size(persist_directory)
+    db = sqlite3.connect(db_path)
+    try:
+        live = {segment_id for (segment_id,) in db.execute("SELECT id FROM segments")}
+        dropped = "SELECT id FROM embeddings WHERE segment_id NOT IN (SELECT id FROM segments)"
+        db.execute(f"DELETE FROM embedding_fulltext_search WHERE rowid IN ({dropped})")
+        db.execute(f"DELETE FROM embedding_metadata WHERE id IN ({dropped})")
+        db.execute("DELETE FROM embeddings WHERE segment_id NOT IN (SELECT id FROM segments)")
+        db.execute("DELETE FROM max_seq_id WHERE segment_id NOT IN (SELECT id FROM segments)")
+        db.commit()
+        db.execute("VACUUM")
+    finally:
+        db.close()
+    for name in os.listdir(persist_directory):
+        path = os.path.join(persist_directory, name)
+        if os.path.isdir(path) and re.fullmatch(r"[0-9a-f]{8}(-[0-9a-f]{4}){3}-[0-9a-f]{12}", name) and name not in live:
+            shutil.rmtree(path, ignore_errors=True)
+    return before - _dir_size(persist_directory)
+
+def compact(progress=None):
+    """Rebuild the collection from a fresh snapshot and return disk usage.
+
+    Chroma leaves deleted vectors in its HNSW files and free pages in its
+    SQLite database; a rebuild writes a dense index through the Chroma API.
+    The replaced collection's files stay on disk until `purge` is run from
+    the CLI with the app stopped.
+    """
+    persist_directory = vector_store_directory()
+    with _lock:
+        before = _dir_size(persist_directory)
+        path = create_snapshot()
+        chunks = restore_snapshot(path, progress)
+        keyword_index.vacuum()
+        return {"snapshot": os.path.basename(path), "chunks": chunks, "bytes_before": before, "bytes_after": _dir_size(persist_directory)}
+
+def main():
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Snapshot, restore and compact the vector store.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create")
+    create.add_argument("--dtype", choices=["float32", "float16"])
+    restore = commands.add_parser("restore")
+    restore.add_argument("name", nargs="?", help="snapshot directory name (default: newest)")
+    commands.add_parser("compact")
+    commands.add_parser("purge", help="reclaim space left by dropped collections; run only while the app is stopped")
+    commands.add_parser("list")
+    args = parser.parse_args()
+
+    if args.command == "create":
+        print(create_snapshot(args.dtype))
+    elif args.command == "restore":
+        path = os.path.join(snapshot_root(), args.name) if args.name else None
+        print(f"Restored {restore_snapshot(path)} chunks")
+    elif args.command == "compact":
+        print(json.dumps(compact(), indent=2))
+    elif args.command == "purge":
+        print(f"Reclaimed {purge_dropped_segments()} bytes")
+    else:
+        for path, manifest in list_snapshots():
+            print(f"{manifest['name']}  {manifest['count']} chunks  {manifest['dtype']}  {manifest['embedding_model']}  {manifest['bytes']} bytes")
+
+if __name__ == "__main__":
+    main()
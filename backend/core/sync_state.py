@@ -0,0 +1,92 @@
+import json
+import sqlite3
+import threading
+from backend.core import registry
+from backend.core.config import get_setting
+
+# Small persistent key/value store for sync cursors (Gmail historyId, Drive
+# page tokens, manifests). Values are stored as JSON.
+GMAIL_KEY = "gmail"
+DRIVE_KEY = "drive"
+DRIVE_MANIFEST_KEY = "drive_manifest"
+WEB_PREFIX = "web:"
+PDF_PREFIX = "pdf:"
+_lock = threading.Lock()
+
+def _connect():
+    db = sqlite3.connect(get_setting("SYNC_STATE_PATH", "./sync_state.sqlite3"), check_same_thread=False)
+    db.execute("CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    db.commit()
+    return db
+
+def _db():
+    return registry.get_or_create("sync_state_db", _connect)
+
+def get_state(key: str, default=None):
+    with _lock:
+        row = _db().execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+    return json.loads(row[0]) if row else default
+
+def set_state(key: str, value):
+    with _lock:
+        db = _db()
+        db.execute("INSERT OR REPLACE INTO sync_state VALUES (?, ?)", (key, json.dumps(value)))
+        db.commit()
+
+def delete_state(key: str):
+    with _lock:
+        db = _db()
+        db.execute("DELETE FROM sync_state WHERE key = ?", (key,))
+        db.commit()
+
+def clear_state():
+    with _lock:
+        db = _db()
+        db.execute("DELETE FROM sync_state")
+        db.commit()
+
+def all_state():
+    with _lock:
+        rows = _db().execute("SELECT key, value FROM sync_state").fetchall()
+    return {key: json.loads(value) for key, value in rows}
+
+def replace_state(values: dict):
+    """Swap the whole store for `values` in one transaction."""
+    with _lock:
+        db = _db()
+        db.execute("DELETE FROM sync_state")
+        db.executemany("INSERT INTO sync_state VALUES (?, ?)", [(key, json.dumps(value)) for key, value in values.items()])
+        db.commit()
+
+def forget_sources(metadatas):
+    """Drop the sync state behind deleted chunks so their sources can be ingested again.
+
+    A web page loses its ETag and content hash, a PDF its completion
+    marker. A Drive file loses its
+    manifest entry and Gmail its history cursor, and both fall back to a
+    full listing next time; files and messages still indexed are skipped
+    there without a download.
+    """
+    urls, pdf_hashes, drive_ids, gmail = set(), set(), set(), False
+    for metadata in metadatas:
+        source_type = (metadata or {}).get("source_type")
+        if source_type == "web":
+            urls.add(metadata.get("url") or metadata.get("source"))
+        elif source_type == "pdf" and metadata.get("file_hash"):
+            pdf_hashes.add(metadata["file_hash"])
+        elif source_type == "drive":
+            drive_ids.add(metadata.get("drive_file_id"))
+        elif source_type == "gmail":
+            gmail = True
+    for url in urls:
+        delete_state(WEB_PREFIX + url)
+    for file_hash in pdf_hashes:
+        delete_state(PDF_PREFIX + file_hash)
+    if drive_ids:
+        manifest = get_state(DRIVE_MANIFEST_KEY, {})
+        for file_id in drive_ids:
+            manifest.pop(file_id, None)
+        set_state(DRIVE_MANIFEST_KEY, manifest)
+        delete_state(DRIVE_KEY)
+    if gmail:
+        delete_state(GMAIL_KEY)
@@ -2,38 +2,169 @@ import os
 import streamlit as st
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_community.vectorstores import Chroma
+from backend.core import registry, keyword_index
+from backend.core.config import get_setting, get_int, get_bool
+from backend.core.embedding_cache import CachedEmbeddings
+from backend.core.local_embeddings import HashingEmbeddings, OnnxEmbeddings
+from backend.core.quantized_store import QuantizedVectorStore
+from backend.core.answer_cache import invalidate_sources, invalidate_all
+from backend.core.sync_state import clear_state, forget_sources
 
-def get_vector_store():
-    if "CHROMA_PERSIST_DIR" in st.secrets:
-        persist_directory = st.secrets["CHROMA_PERSIST_DIR"]
+EMBEDDING_MODEL = "models/gemini-embedding-001"
+EMBEDDING_TASK_TYPE = "retrieval_document"
+
+def embedding_model_id():
+    """Identity of the configured embedding model, as recorded on the collection."""
+    backend = get_setting("EMBEDDING_BACKEND", "google")
+    if backend == "google":
+        return EMBEDDING_MODEL
+    if backend == "hashing":
+        return HashingEmbeddings(get_int("HASHING_EMBEDDING_DIM", 768)).model
+    if backend == "onnx":
+        return OnnxEmbeddings.model
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
+
+def _create_embeddings():
+    backend = get_setting("EMBEDDING_BACKEND", "google")
+    if backend == "hashing":
+        # Cheaper to recompute than to look up; never cached.
+        return HashingEmbeddings(get_int("HASHING_EMBEDDING_DIM", 768))
+    if backend == "onnx":
+        embeddings = OnnxEmbeddings(batch_size=get_int("ONNX_EMBEDDING_BATCH_SIZE", 32))
     else:
-        persist_directory = os.environ.get("CHROMA_PERSIST_DIR", "./chroma_db")
-        
-    embeddings = GoogleGenerativeAIEmbeddings(
-        model="models/gemini-embedding-001",
-        google_api_key=st.secrets.get("GOOGLE_API_KEY", os.environ.get("GOOGLE_API_KEY")),
-        task_type="retrieval_document"
+        embeddings = GoogleGenerativeAIEmbeddings(
+            model=EMBEDDING_MODEL,
+            google_api_key=st.secrets.get("GOOGLE_API_KEY", os.environ.get("GOOGLE_API_KEY")),
+            task_type=EMBEDDING_TASK_TYPE
+        )
+    if not get_bool("EMBEDDING_CACHE_ENABLED", True):
+        return embeddings
+    return CachedEmbeddings(
+        embeddings,
+        cache_dir=get_setting("EMBEDDING_CACHE_DIR", "./embedding_cache"),
+        model=embedding_model_id(),
+        task_type=EMBEDDING_TASK_TYPE if backend == "google" else "",
+        max_entries=get_int("EMBEDDING_CACHE_MAX_ENTRIES", 200_000)
     )
+
+def _check_embedding_model(collection, model: str):
+    metadata = dict(collection.metadata or {})
+    # Collections created before models were recorded were all Gemini-embedded.
+    recorded = metadata.get("embedding_model", EMBEDDING_MODEL if collection.count() else None)
+    if recorded is not None and recorded != model:
+        raise RuntimeError(
+            f"Collection '{collection.name}' holds vectors from {recorded} but EMBEDDING_BACKEND "
+            f"selects {model}. Switch back, or wipe and re-index to change models."
+        )
+    if metadata.get("embedding_model") != model:
+        metadata["embedding_model"] = model
+        collection.modify(metadata={k: v for k, v in metadata.items() if not k.startswith("hnsw:")})
+
+def vector_store_directory():
+    if get_setting("VECTOR_BACKEND", "chroma") == "quantized":
+        return get_setting("QUANTIZED_INDEX_DIR", "./quantized_index")
+    return get_setting("CHROMA_PERSIST_DIR", "./chroma_db")
+
+def _create_vector_store():
+    persist_directory = vector_store_directory()
+    model = embedding_model_id()
+
+    backend = get_setting("VECTOR_BACKEND", "chroma")
+    if backend == "quantized":
+        vector_store = QuantizedVectorStore(
+            persist_directory,
+            get_embeddings(),
+            collection_metadata={"embedding_model": model},
+            rescore=get_int("QUANTIZED_RESCORE", 200)
+        )
+        _check_embedding_model(vector_store._collection, model)
+        return vector_store
+    if backend != "chroma":
+        raise ValueError(f"Unknown VECTOR_BACKEND: {backend}")
+
     vector_store = Chroma(
         collection_name="pkaa_collection",
-        embedding_function=embeddings,
-        persist_directory=persist_directory
+        embedding_function=get_embeddings(),
+        persist_directory=persist_directory,
+        collection_metadata={"embedding_model": model}
     )
+    _check_embedding_model(vector_store._collection, model)
     return vector_store
 
+def get_embeddings():
+    return registry.get_or_create("embeddings", _create_embeddings)
+
+def get_vector_store():
+    return registry.get_or_create("vector_store", _create_vector_store)
+
+def get_embedding_cache_stats():
+    embeddings = get_embeddings()
+    if isinstance(embeddings, CachedEmbeddings):
+        return embeddings.stats()
+    return None
+
+def delete_chunks(where: dict = None, ids=None):
+    """Delete matching chunks and invalidate cached answers that cited them."""
+    collection = get_vector_store()._collection
+    found = collection.get(where=where, ids=ids, include=["metadatas"])
+    if found["ids"]:
+        collection.delete(ids=found["ids"])
+        keyword_index.delete_chunks(found["ids"])
+        invalidate_sources({m.get("source", "Unknown") for m in found["metadatas"]})
+    return len(found["ids"])
+
+def delete_where(where: dict, sources=None, progress=None):
+    """Delete every chunk matching `where`, one page of ids at a time.
+
+    Ids and metadata are fetched DELETE_BATCH_SIZE per round trip, never
+    documents or vectors. Cached answers citing `sources` are invalidated,
+    or all of them when the caller can't say which sources the filter
+    covers, and the sync state of the deleted sources is dropped so they can
+    be ingested again.
+    """
+    collection = get_vector_store()._collection
+    batch_size = get_int("DELETE_BATCH_SIZE", 1000)
+    deleted = 0
+    while True:
+        page = collection.get(where=where, limit=batch_size, include=["metadatas"])
+        ids = page["ids"]
+        if not ids:
+            break
+        collection.delete(ids=ids)
+        keyword_index.delete_chunks(ids)
+        forget_sources(page["metadatas"])
+        deleted += len(ids)
+        if progress:
+            progress(chunks=len(ids))
+    if deleted:
+        if sources:
+            invalidate_sources(sources)
+        else:
+            invalidate_all()
+    return deleted
+
 def delete_source(source_name: str):
-    vector_store = get_vector_store()
-    docs = vector_store.get(where={"source": source_name})
-    if docs["ids"]:
-        vector_store.delete(ids=docs["ids"])
-    return len(docs["ids"])
+    return delete_where({"source": source_name}, sources=[source_name])
+
+def ensure_keyword_index():
+    """Backfill the keyword index for collections indexed before it existed."""
+    collection = get_vector_store()._collection
+    if keyword_index.count() == 0 and collection.count() > 0:
+        keyword_index.rebuild(collection)
 
 def source_exists(source_name: str):
     vector_store = get_vector_store()
     docs = vector_store.get(where={"source": source_name}, limit=1)
     return len(docs["ids"]) > 0
 
-def wipe_vector_store():
+def wipe_vector_store(clear_sync_state: bool = True):
     vector_store = get_vector_store()
     vector_store.delete_collection()
+    keyword_index.clear()
+    invalidate_all()
+    # Cursors and manifests describe chunks that no longer exist.
+    if clear_sync_state:
+        clear_state()
+    # The cached store and chain point at the dropped collection.
+    registry.invalidate("vector_store", "rag_chain")
     return True
@@ -1,87 +1,194 @@
 from googleapiclient.discovery import build
 from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from datetime import datetime
 from backend.core.auth import get_google_credentials
-from backend.core.vector_store import get_vector_store
+from backend.core.vector_store import get_vector_store, delete_chunks
+from backend.core.indexing import SourceIndexer
+from backend.core.chunking import chunk_documents, chunk_limits
+from backend.core.sync_state import get_state, set_state, DRIVE_KEY, DRIVE_MANIFEST_KEY
+from backend.core.config import get_int
+import hashlib
 import io
+import logging
 import os
+import tempfile
 from googleapiclient.http import MediaIoBaseDownload
 
-def fetch_drive_files():
+logger = logging.getLogger(__name__)
+
+STATE_KEY = DRIVE_KEY
+MANIFEST_KEY = DRIVE_MANIFEST_KEY
+DOC_MIME = 'application/vnd.google-apps.document'
+PDF_MIME = 'application/pdf'
+FILE_FIELDS = "id, name, mimeType, modifiedTime, trashed"
+# Files processed between manifest writes; the manifest is one JSON value.
+MANIFEST_CHECKPOINT_FILES = 100
+
+def _download(request, fh=None):
+    fh = io.BytesIO() if fh is None else fh
+    downloader = MediaIoBaseDownload(fh, request)
+    done = False
+    while done is False:
+        status, done = downloader.next_chunk()
+    fh.seek(0)
+    return fh
+
+def _list_all_files(service):
+    page_token = None
+    while True:
+        results = service.files().list(
+            pageSize=1000,
+            fields=f"nextPageToken, files({FILE_FIELDS})",
+            q=f"(mimeType = '{DOC_MIME}' or mimeType = '{PDF_MIME}') and trashed = false",
+            pageToken=page_token
+        ).execute()
+        yield from results.get('files', [])
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            return
+
+def _list_changes(service, page_token):
+    changes = []
+    while True:
+        results = service.changes().list(
+            pageToken=page_token,
+            pageSize=1000,
+            fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({FILE_FIELDS}))"
+        ).execute()
+        changes.extend(results.get('changes', []))
+        if 'newStartPageToken' in results:
+            return changes, results['newStartPageToken']
+        page_token = results['nextPageToken']
+
+def _with_metadata(pages, metadata):
+    for splits in pages:
+        for split in splits:
+            split.metadata.update(metadata)
+        yield splits
+
+def _index_pages(file_id: str, pages, changed: bool, progress=None):
+    """Stream per-page chunk lists into the file's chunks, in embedding-sized batches.
+
+    Unchanged content keeps its chunk ids, so this embeds nothing and only
+    rewrites metadata such as a new name or modifiedTime.
+    """
+    flush_at = get_int("EMBED_BATCH_SIZE", 100) * get_int("EMBED_MAX_IN_FLIGHT", 4)
+    indexer = SourceIndexer(f"drive:{file_id}", {"drive_file_id": file_id}, progress=progress)
+    pending = []
+    for splits in pages:
+        pending.extend(splits)
+        if len(pending) >= flush_at:
+            if changed and progress:
+                progress(chunks=len(pending))
+            indexer.add(pending)
+            pending = []
+    if pending:
+        if changed and progress:
+            progress(chunks=len(pending))
+        indexer.add(pending)
+    indexer.finish()
+
+def _index_file(service, file, known_hash=None, progress=None):
+    """Download and index a Drive file; returns (content hash, whether it changed)."""
+    file_id = file['id']
+    name = file['name']
+    metadata = {
+        "drive_file_id": file_id,
+        "filename": name,
+        "last_modified": file['modifiedTime'],
+        "source": f"Drive: {name}",
+        "source_type": "drive",
+        "ingestion_timestamp": datetime.now().isoformat()
+    }
+
+    if file['mimeType'] == DOC_MIME:
+        data = _download(service.files().export_media(fileId=file_id, mimeType='text/plain')).getvalue()
+        content = data.decode('utf-8')
+        content_hash = hashlib.sha256(data).hexdigest()
+        pages = [chunk_documents([Document(page_content=content, metadata=metadata)], *chunk_limits())] if content else []
+        _index_pages(file_id, pages, content_hash != known_hash, progress)
+        return content_hash, content_hash != known_hash
+
+    from backend.ingestion.pdf_loader import iter_pdf_splits
+
+    # Downloaded to a temp file, so hashing and page extraction (by path, in
+    # the process pool for large files) never hold the whole PDF in memory.
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as fh:
+        _download(service.files().get_media(fileId=file_id), fh)
+    try:
+        digest = hashlib.sha256()
+        with open(fh.name, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        content_hash = digest.hexdigest()
+        pages = _with_metadata(iter_pdf_splits(fh.name, name, file_id), metadata)
+        _index_pages(file_id, pages, content_hash != known_hash, progress)
+    finally:
+        os.unlink(fh.name)
+    return content_hash, content_hash != known_hash
+
+def process_drive(progress=None):
+    """Sync Google Docs and PDFs from Drive.
+
+    The first run lists every file; later runs read only the Changes API
+    delta since the stored start page token. A local manifest of
+    modifiedTime and content hash per file lets unchanged files skip the
+    download and the re-embed respectively.
+    """
     creds = get_google_credentials()
     service = build('drive', 'v3', credentials=creds)
-    
-    results = service.files().list(
-        pageSize=10, 
-        fields="nextPageToken, files(id, name, mimeType, modifiedTime)",
-        q="mimeType = 'application/vnd.google-apps.document' or mimeType = 'application/pdf'"
-    ).execute()
-    files = results.get('files', [])
-    
-    docs = []
+
+    state = get_state(STATE_KEY, {})
+    manifest = get_state(MANIFEST_KEY, {})
+    if manifest and not get_vector_store().get(where={"source_type": "drive"}, limit=1, include=[])["ids"]:
+        # Nothing from Drive is indexed, so the manifest and token are stale.
+        state, manifest = {}, {}
+
+    if state.get("page_token"):
+        changes, next_token = _list_changes(service, state["page_token"])
+        files = list(state.get("retry", []))
+        for change in changes:
+            file = change.get('file') or {}
+            if change.get('removed') or file.get('trashed'):
+                delete_chunks(where={"drive_file_id": change['fileId']})
+                manifest.pop(change['fileId'], None)
+            elif file.get('mimeType') in (DOC_MIME, PDF_MIME):
+                files.append(file)
+        set_state(MANIFEST_KEY, manifest)
+    else:
+        # Take the token before listing so edits made mid-sync show up next time.
+        next_token = service.changes().getStartPageToken().execute()['startPageToken']
+        files = _list_all_files(service)
+
+    num_files = 0
+    retry = []
+    dirty = 0
     for file in files:
         file_id = file['id']
-        name = file['name']
-        mime_type = file['mimeType']
-        
-        content = ""
+        entry = manifest.get(file_id)
+        if entry and entry["modified_time"] == file['modifiedTime']:
+            continue
+
         try:
-            if mime_type == 'application/vnd.google-apps.document':
-                request = service.files().export_media(fileId=file_id, mimeType='text/plain')
-                fh = io.BytesIO()
-                downloader = MediaIoBaseDownload(fh, request)
-                done = False
-                while done is False:
-                    status, done = downloader.next_chunk()
-                content = fh.getvalue().decode('utf-8')
-                if content:
-                    metadata = {
-                        "drive_file_id": file_id,
-                        "filename": name,
-                        "last_modified": file['modifiedTime'],
-                        "source": f"Drive: {name}",
-                        "source_type": "drive",
-                        "ingestion_timestamp": datetime.now().isoformat()
-                    }
-                    docs.append(Document(page_content=content, metadata=metadata))
-            elif mime_type == 'application/pdf':
-                from backend.ingestion.pdf_loader import process_pdf
-                
-                request = service.files().get_media(fileId=file_id)
-                fh = io.BytesIO()
-                downloader = MediaIoBaseDownload(fh, request)
-                done = False
-                while done is False:
-                    status, done = downloader.next_chunk()
-                
-                os.makedirs("temp_uploads", exist_ok=True)
-                temp_path = f"temp_uploads/drive_{file_id}.pdf"
-                with open(temp_path, "wb") as f:
-                    f.write(fh.getbuffer())
-                
-                try:
-                    process_pdf(temp_path, name)
-                finally:
-                    if os.path.exists(temp_path):
-                        os.remove(temp_path)
-        except Exception as e:
-            pass
-            
-    return docs
-
-def process_drive():
-    docs = fetch_drive_files()
-    if not docs:
-        return 0
-        
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200
-    )
-    splits = text_splitter.split_documents(docs)
-    
-    vector_store = get_vector_store()
-    vector_store.add_documents(splits)
-    
-    return len(docs)
+            content_hash, changed = _index_file(service, file, entry and entry["hash"], progress)
+        except Exception:
+            logger.exception("Drive file %s (%s) failed; retrying on the next sync", file_id, file.get('name'))
+            if progress:
+                progress(errors=1)
+            retry.append(file)
+            continue
+
+        if changed:
+            num_files += 1
+            if progress:
+                progress(documents=1)
+
+        manifest[file_id] = {"name": file['name'], "modified_time": file['modifiedTime'], "hash": content_hash}
+        dirty += 1
+        if dirty >= MANIFEST_CHECKPOINT_FILES:
+            set_state(MANIFEST_KEY, manifest)
+            dirty = 0
+
+    set_state(MANIFEST_KEY, manifest)
+    set_state(STATE_KEY, {"page_token": next_token, "retry": retry})
+    return num_files
@@ -1,67 +1,262 @@
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from datetime import datetime
 from backend.core.auth import get_google_credentials
-from backend.core.vector_store import get_vector_store
+from backend.core.vector_store import get_vector_store, delete_chunks
+from backend.core.indexing import make_chunk_ids, upsert_documents
+from backend.core.chunking import chunk_documents, chunk_limits
+from backend.core import metrics
+from backend.core.sync_state import get_state, set_state, GMAIL_KEY
+from backend.core.config import get_int
 import base64
+from collections import Counter
+import queue
+import random
+import threading
+import time
 
-def fetch_gmail_emails(max_results=10):
+STATE_KEY = GMAIL_KEY
+LIST_PAGE_SIZE = 500
+
+def _decode(data):
+    return base64.urlsafe_b64decode(data).decode('utf-8', errors='replace')
+
+def _extract_body(payload):
+    """Depth-first search for the first text/plain part, so bodies nested in
+    multipart/alternative or forwarded message/rfc822 parts are found too."""
+    if 'parts' not in payload:
+        data = payload.get('body', {}).get('data')
+        return _decode(data) if data else ""
+
+    for part in payload['parts']:
+        if part.get('mimeType') == 'text/plain':
+            data = part.get('body', {}).get('data')
+            if data:
+                return _decode(data)
+    for part in payload['parts']:
+        if 'parts' in part:
+            body = _extract_body(part)
+            if body:
+                return body
+    return ""
+
+def _parse_message(msg_data):
+    payload = msg_data.get('payload', {})
+    headers = payload.get('headers', [])
+
+    subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject')
+    sender = next((h['value'] for h in headers if h['name'] == 'From'), 'Unknown')
+    date = next((h['value'] for h in headers if h['name'] == 'Date'), 'Unknown')
+
+    body = _extract_body(payload)
+    if not body:
+        return None
+
+    metadata = {
+        "email_id": msg_data['id'],
+        "subject": subject,
+        "sender": sender,
+        "date": date,
+        "source": f"Gmail: {subject}",
+        "source_type": "gmail",
+        "ingestion_timestamp": datetime.now().isoformat()
+    }
+    return Document(page_content=body, metadata=metadata)
+
+def _fetch_batch(service, message_ids):
+    responses, failed = {}, []
+
+    def callback(request_id, response, exception):
+        if exception is not None:
+            failed.append((request_id, exception))
+        else:
+            responses[request_id] = response
+
+    batch = service.new_batch_http_request(callback=callback)
+    for message_id in message_ids:
+        batch.add(service.users().messages().get(userId='me', id=message_id), request_id=message_id)
+    batch.execute()
+    return responses, failed
+
+def fetch_gmail_emails(service, message_ids, progress=None):
+    """Yield parsed Documents one Gmail batch request (up to 50 gets) at a time.
+
+    Gets rejected inside a batch for rate limiting are retried in a later
+    batch with backoff. Messages deleted since they were listed (404) are
+    skipped and counted as errors; any other per-message error is raised.
+    """
+    batch_size = get_int("GMAIL_BATCH_SIZE", 50)
+    pending = list(message_ids)
+    attempt = 0
+    while pending:
+        retry = []
+        for offset in range(0, len(pending), batch_size):
+            responses, failed = _fetch_batch(service, pending[offset:offset + batch_size])
+            for message_id, exception in failed:
+                status = exception.resp.status if getattr(exception, 'resp', None) is not None else None
+                if status in (403, 429, 500, 503):
+                    retry.append(message_id)
+                elif status == 404:
+                    if progress:
+                        progress(errors=1)
+                else:
+                    raise exception
+            docs = [doc for doc in map(_parse_message, responses.values()) if doc]
+            if docs:
+                yield docs
+
+        if retry and attempt >= get_int("GMAIL_MAX_RETRIES", 5):
+            raise RuntimeError(f"Gave up fetching {len(retry)} Gmail messages after repeated rate limiting")
+        if retry:
+            time.sleep(random.uniform(0, 2 ** attempt))
+            attempt += 1
+        pending = retry
+
+def _prefetch(iterator, depth: int = 2):
+    """Run `iterator` in a background thread so fetching the next batch
+    overlaps with splitting and embedding the current one."""
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for item in iterator:
+                if stop.is_set():
+                    return
+                buffer.put(item)
+        except BaseException as e:
+            buffer.put(e)
+        buffer.put(done)
+
+    worker = threading.Thread(target=produce, daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        # Unblock the producer if the consumer bailed out early.
+        stop.set()
+        while worker.is_alive():
+            try:
+                buffer.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+def _full_sync_pages(service, state, max_results):
+    """Page through the whole mailbox, resuming from a saved page token.
+
+    The historyId is captured before listing starts so anything that arrives
+    during a long first sync is picked up by the next incremental sync.
+    """
+    history_id = state.get("pending_history_id")
+    if not history_id:
+        history_id = service.users().getProfile(userId='me').execute()['historyId']
+    page_token = state.get("page_token")
+
+    listed = 0
+    while True:
+        page_size = LIST_PAGE_SIZE if max_results is None else min(LIST_PAGE_SIZE, max_results - listed)
+        results = service.users().messages().list(
+            userId='me', maxResults=page_size, pageToken=page_token
+        ).execute()
+        message_ids = [m['id'] for m in results.get('messages', [])]
+        listed += len(message_ids)
+        page_token = results.get('nextPageToken')
+
+        if page_token:
+            checkpoint = {"pending_history_id": history_id, "page_token": page_token}
+        else:
+            checkpoint = {"history_id": history_id}
+        yield message_ids, [], checkpoint
+
+        if not page_token or (max_results is not None and listed >= max_results):
+            return
+
+def _history_pages(service, history_id):
+    page_token = None
+    latest = history_id
+    while True:
+        results = service.users().history().list(
+            userId='me',
+            startHistoryId=history_id,
+            historyTypes=['messageAdded', 'messageDeleted'],
+            pageToken=page_token
+        ).execute()
+        added, deleted = [], []
+        for record in results.get('history', []):
+            added.extend(m['message']['id'] for m in record.get('messagesAdded', []))
+            deleted.extend(m['message']['id'] for m in record.get('messagesDeleted', []))
+        latest = results.get('historyId', latest)
+        page_token = results.get('nextPageToken')
+
+        # The history cursor can only advance once every page is processed.
+        yield added, deleted, None if page_token else {"history_id": latest}
+
+        if not page_token:
+            return
+
+def _has_gmail_chunks():
+    return bool(get_vector_store().get(where={"source_type": "gmail"}, limit=1, include=[])["ids"])
+
+def _message_pages(service, max_results):
+    state = get_state(STATE_KEY, {})
+    if not state.get("history_id"):
+        yield from _full_sync_pages(service, state, max_results)
+        return
+    if not _has_gmail_chunks():
+        # A cursor without any indexed mail would only ever follow deltas.
+        yield from _full_sync_pages(service, {}, max_results)
+        return
+    try:
+        yield from _history_pages(service, state["history_id"])
+    except HttpError as e:
+        # History older than about a week expires; fall back to a full listing.
+        if e.resp.status != 404:
+            raise
+        yield from _full_sync_pages(service, {}, max_results)
+
+def _indexed_email_ids(message_ids):
+    if not message_ids:
+        return set()
+    existing = get_vector_store().get(where={"email_id": {"$in": message_ids}}, include=["metadatas"])
+    return {m["email_id"] for m in existing["metadatas"]}
+
+def process_gmail(max_results=None, progress=None):
     creds = get_google_credentials()
     service = build('gmail', 'v1', credentials=creds)
-    
-    results = service.users().messages().list(userId='me', maxResults=max_results).execute()
-    messages = results.get('messages', [])
-    
-    docs = []
-    for msg in messages:
-        msg_data = service.users().messages().get(userId='me', id=msg['id']).execute()
-        payload = msg_data.get('payload', {})
-        headers = payload.get('headers', [])
-        
-        subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject')
-        sender = next((h['value'] for h in headers if h['name'] == 'From'), 'Unknown')
-        date = next((h['value'] for h in headers if h['name'] == 'Date'), 'Unknown')
-        
-        body = ""
-        if 'parts' in payload:
-            for part in payload['parts']:
-                if part['mimeType'] == 'text/plain':
-                    data = part['body'].get('data')
-                    if data:
-                        body = base64.urlsafe_b64decode(data).decode('utf-8')
-                        break
-        else:
-            data = payload.get('body', {}).get('data')
-            if data:
-                body = base64.urlsafe_b64decode(data).decode('utf-8')
-
-        if body:
-            metadata = {
-                "email_id": msg['id'],
-                "subject": subject,
-                "sender": sender,
-                "date": date,
-                "source": f"Gmail: {subject}",
-                "source_type": "gmail",
-                "ingestion_timestamp": datetime.now().isoformat()
-            }
-            docs.append(Document(page_content=body, metadata=metadata))
-            
-    return docs
-
-def process_gmail(max_results=10):
-    docs = fetch_gmail_emails(max_results)
-    if not docs:
-        return 0
-        
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200
-    )
-    splits = text_splitter.split_documents(docs)
-    
-    vector_store = get_vector_store()
-    vector_store.add_documents(splits)
-    
-    return len(docs)
+    # httplib2 connections aren't thread-safe; the prefetch thread gets its own.
+    fetch_service = build('gmail', 'v1', credentials=creds)
+
+    max_tokens, min_tokens = chunk_limits()
+
+    num_emails = 0
+    for added, deleted, checkpoint in _message_pages(service, max_results):
+        if deleted:
+            delete_chunks(where={"email_id": {"$in": deleted}})
+
+        # A message added and deleted within the same delta can no longer be fetched.
+        gone = set(deleted)
+        indexed = _indexed_email_ids(added)
+        new_ids = [i for i in dict.fromkeys(added) if i not in indexed and i not in gone]
+        for docs in _prefetch(fetch_gmail_emails(fetch_service, new_ids, progress)):
+            # Quoted history repeats mail that is indexed on its own.
+            splits = chunk_documents(docs, max_tokens, min_tokens, strip_quotes=True)
+            for count in Counter(split.metadata["email_id"] for split in splits).values():
+                metrics.observe("chunks_per_document", count)
+            if progress:
+                progress(documents=len(docs), chunks=len(splits))
+            ids = make_chunk_ids(splits, lambda metadata: f"gmail:{metadata['email_id']}")
+            upsert_documents(splits, ids, progress=progress)
+            num_emails += len(docs)
+
+        if checkpoint:
+            set_state(STATE_KEY, checkpoint)
+
+    return num_emails
@@ -0,0 +1,29 @@
+import os
+import fitz
+from langchain_core.documents import Document
+from backend.core.chunking import DEFAULT_MAX_TOKENS, DEFAULT_MIN_TOKENS, chunk_documents
+
+# Kept free of app imports (Streamlit, LangChain Google clients, Chroma) so
+# spawned extraction workers start quickly.
+
+def open_pdf(source):
+    if isinstance(source, (str, os.PathLike)):
+        return fitz.open(source)
+    if isinstance(source, (bytes, bytearray)):
+        return fitz.open(stream=source, filetype="pdf")
+    raise TypeError(f"Unsupported PDF source: {type(source).__name__}")
+
+def iter_page_splits(source, start: int = 0, stop: int = None,
+                     max_tokens: int = DEFAULT_MAX_TOKENS, min_tokens: int = DEFAULT_MIN_TOKENS):
+    """Yield the chunks of each page in [start, stop), one list per page."""
+    with open_pdf(source) as pdf:
+        info = {k: v for k, v in (pdf.metadata or {}).items() if v}
+        total_pages = len(pdf)
+        for number in range(start, total_pages if stop is None else stop):
+            metadata = dict(info, page=number, total_pages=total_pages)
+            page = Document(page_content=pdf[number].get_text(), metadata=metadata)
+            yield chunk_documents([page], max_tokens, min_tokens)
+
+def extract_page_range(source, start: int, stop: int,
+                       max_tokens: int = DEFAULT_MAX_TOKENS, min_tokens: int = DEFAULT_MIN_TOKENS):
+    return list(iter_page_splits(source, start, stop, max_tokens, min_tokens))
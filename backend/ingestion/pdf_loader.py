@@ -1,36 +1,142 @@
-from langchain_community.document_loaders import PyMuPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+import hashlib
+import io
+import multiprocessing
+import tempfile
 import uuid
 import os
-from backend.core.vector_store import get_vector_store, source_exists
+from backend.core import registry
+from backend.core.config import get_int
+from backend.core.vector_store import get_vector_store
+from backend.core.indexing import SourceIndexer
+from backend.core.chunking import chunk_limits
+from backend.core.sync_state import get_state, set_state, PDF_PREFIX
+from backend.ingestion.pdf_extract import open_pdf, iter_page_splits, extract_page_range
 
-def process_pdf(file_path: str, filename: str):
-    if source_exists(filename):
+def _pdf_workers():
+    return get_int("PDF_WORKERS", os.cpu_count() or 1)
+
+def get_pdf_pool():
+    # spawn, not fork: the parent runs gRPC and SQLite threads that don't
+    # survive a fork.
+    return registry.get_or_create("pdf_pool", lambda: ProcessPoolExecutor(
+        max_workers=_pdf_workers(),
+        mp_context=multiprocessing.get_context("spawn")
+    ))
+
+def _shareable(source):
+    """Reduce a PDF source to a path or bytes that can be sent to workers."""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    if isinstance(source, (bytes, bytearray)):
+        return source
+    if isinstance(source, io.BytesIO):
+        return source.getvalue()
+    # A spooled upload that has already rolled over to disk is opened by
+    # path, so MuPDF pages it in instead of us reading it all into memory.
+    name = getattr(source, "name", None)
+    if isinstance(name, str) and os.path.isfile(name):
+        return name
+    return source.read()
+
+def iter_pages_parallel(source):
+    """Yield per-page chunk lists in page order.
+
+    Large PDFs are sharded into page ranges extracted by the process pool.
+    At most two shards per worker are in flight, so extraction runs ahead of
+    embedding without piling the whole document up in memory.
+    """
+    source = _shareable(source)
+    with open_pdf(source) as pdf:
+        total_pages = len(pdf)
+    max_tokens, min_tokens = chunk_limits()
+
+    workers = _pdf_workers()
+    if workers <= 1 or total_pages < get_int("PDF_PARALLEL_MIN_PAGES", 32):
+        yield from iter_page_splits(source, 0, None, max_tokens, min_tokens)
+        return
+
+    spooled = None
+    if not isinstance(source, str):
+        # Bytes would be pickled to a worker once per shard; a path costs nothing.
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+            f.write(source)
+        source = spooled = f.name
+
+    try:
+        shard_size = max(get_int("PDF_PAGES_PER_SHARD", 8), -(-total_pages // (workers * 8)))
+        shards = deque(range(0, total_pages, shard_size))
+        pool = get_pdf_pool()
+        in_flight = deque()
+        while shards or in_flight:
+            while shards and len(in_flight) < workers * 2:
+                start = shards.popleft()
+                in_flight.append(pool.submit(extract_page_range, source, start, min(start + shard_size, total_pages), max_tokens, min_tokens))
+            yield from in_flight.popleft().result()
+    finally:
+        if spooled:
+            for future in in_flight:
+                future.cancel()
+            os.unlink(spooled)
+
+def iter_pdf_splits(source, filename: str, doc_id: str):
+    timestamp = datetime.now().isoformat()
+
+    for splits in iter_pages_parallel(source):
+        for split in splits:
+            split.metadata.update({
+                "source": filename,
+                "filename": filename,
+                "upload_timestamp": timestamp,
+                "document_id": doc_id,
+                "source_type": "pdf"
+            })
+        yield splits
+
+def _file_hash(source):
+    digest = hashlib.sha256()
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    else:
+        digest.update(source)
+    return digest.hexdigest()
+
+def process_pdf(source, filename: str, progress=None):
+    source = _shareable(source)
+    file_hash = _file_hash(source)
+    # Byte-identical PDFs are indexed once, whatever name they arrive under.
+    # The marker is only written once every chunk is in, so a run that died
+    # part-way is redone (cheaply: chunks already stored are not re-embedded).
+    marker = PDF_PREFIX + file_hash
+    if get_state(marker) and get_vector_store().get(where={"file_hash": file_hash}, limit=1, include=[])["ids"]:
         return "already_indexed"
-        
-    loader = PyMuPDFLoader(file_path)
-    docs = loader.load()
-    
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200
-    )
-    splits = text_splitter.split_documents(docs)
-    
+
     doc_id = str(uuid.uuid4())
-    timestamp = datetime.now().isoformat()
-    
-    for split in splits:
-        split.metadata.update({
-            "source": filename,
-            "filename": filename,
-            "upload_timestamp": timestamp,
-            "document_id": doc_id,
-            "source_type": "pdf"
-        })
-        
-    vector_store = get_vector_store()
-    vector_store.add_documents(splits)
-    
+    flush_at = get_int("EMBED_BATCH_SIZE", 100) * get_int("EMBED_MAX_IN_FLIGHT", 4)
+    # Keyed on filename, so an edited PDF re-embeds only the chunks that changed.
+    indexer = SourceIndexer(filename, {"source": filename}, progress=progress)
+
+    pending = []
+    for splits in iter_pdf_splits(source, filename, doc_id):
+        for split in splits:
+            split.metadata["file_hash"] = file_hash
+        pending.extend(splits)
+        if len(pending) >= flush_at:
+            if progress:
+                progress(chunks=len(pending))
+            indexer.add(pending)
+            pending = []
+    if pending:
+        if progress:
+            progress(chunks=len(pending))
+        indexer.add(pending)
+    indexer.finish()
+    set_state(marker, {"filename": filename, "document_id": doc_id})
+    if progress:
+        progress(documents=1)
+
     return doc_id
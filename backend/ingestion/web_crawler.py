@@ -0,0 +1,231 @@
+import asyncio
+import hashlib
+import re
+import time
+from datetime import datetime
+from urllib.parse import urljoin, urldefrag, urlparse
+from urllib.robotparser import RobotFileParser
+from xml.etree import ElementTree
+import httpx
+from bs4 import BeautifulSoup
+from langchain_core.documents import Document
+from backend.core.config import get_setting, get_int, get_float
+from backend.core.indexing import upsert_source
+from backend.core.chunking import chunk_documents, chunk_limits
+from backend.core.sync_state import get_state, set_state, delete_state, WEB_PREFIX
+from backend.core.vector_store import delete_source, source_exists
+
+# Elements that hold navigation, chrome or code rather than page content.
+BOILERPLATE_TAGS = ["script", "style", "noscript", "template", "svg", "iframe", "form", "nav", "header", "footer", "aside"]
+MAX_STORED_LINKS = 500
+
+class HostLimiter:
+    """Spaces requests to each host at least `delay` seconds apart."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self._delays = {}
+        self._locks = {}
+        self._next = {}
+
+    def set_delay(self, host: str, delay: float):
+        self._delays[host] = max(self.delay, delay)
+
+    async def wait(self, host: str):
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            pause = self._next.get(host, 0.0) - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            self._next[host] = time.monotonic() + self._delays.get(host, self.delay)
+
+def extract_content(html: str):
+    """Return (title, main text, links) with boilerplate stripped."""
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.get_text(strip=True) if soup.title else ""
+    links = [a["href"] for a in soup.find_all("a", href=True)]
+    for tag in soup(BOILERPLATE_TAGS):
+        tag.decompose()
+    root = soup.find("main") or soup.find("article") or soup.body or soup
+    text = root.get_text("\n")
+    text = re.sub(r"[ \t\r\f\v]+", " ", text)
+    text = re.sub(r"\n\s*\n+", "\n\n", text).strip()
+    return title, text, links
+
+def _normalize(url: str):
+    url, _ = urldefrag(url)
+    return url
+
+class Crawler:
+    def __init__(self, seed: str, max_depth: int, max_pages: int, same_domain: bool, use_sitemap: bool, progress=None):
+        self.seed = _normalize(seed)
+        self.host = urlparse(self.seed).netloc.lower()
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.same_domain = same_domain
+        self.use_sitemap = use_sitemap
+        self.progress = progress
+        self.user_agent = get_setting("CRAWL_USER_AGENT", "PKAA-Crawler/1.0")
+        self.limiter = HostLimiter(get_float("CRAWL_HOST_DELAY", 1.0))
+        self.slots = asyncio.Semaphore(get_int("CRAWL_CONCURRENCY", 8))
+        self.robots = {}
+        self.stats = {"fetched": 0, "not_modified": 0, "unchanged": 0, "indexed": 0, "chunks_added": 0, "removed": 0, "skipped": 0, "errors": 0}
+
+    def in_scope(self, url: str):
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https"):
+            return False
+        host = parsed.netloc.lower()
+        if not self.same_domain:
+            return True
+        return host == self.host or host.endswith("." + self.host)
+
+    async def _get(self, client, url: str, headers=None):
+        host = urlparse(url).netloc.lower()
+        async with self.slots:
+            await self.limiter.wait(host)
+            return await client.get(url, headers=headers)
+
+    async def allowed(self, client, url: str):
+        parsed = urlparse(url)
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        if origin not in self.robots:
+            parser = RobotFileParser()
+            try:
+                response = await self._get(client, origin + "/robots.txt")
+                parser.parse(response.text.splitlines() if response.status_code == 200 else [])
+            except httpx.HTTPError:
+                parser.parse([])
+            delay = parser.crawl_delay(self.user_agent)
+            if delay:
+                self.limiter.set_delay(parsed.netloc.lower(), float(delay))
+            self.robots[origin] = parser
+        return self.robots[origin].can_fetch(self.user_agent, url)
+
+    async def sitemap_urls(self, client):
+        parsed = urlparse(self.seed)
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        await self.allowed(client, self.seed)
+        sitemaps = self.robots[origin].site_maps() or [origin + "/sitemap.xml"]
+        urls = []
+        for sitemap in sitemaps[:5]:
+            try:
+                response = await self._get(client, sitemap)
+                if response.status_code != 200:
+                    continue
+                root = ElementTree.fromstring(response.content)
+            except (httpx.HTTPError, ElementTree.ParseError):
+                continue
+            urls.extend(el.text.strip() for el in root.iter() if el.tag.endswith("loc") and el.text)
+        return [_normalize(u) for u in urls if self.in_scope(u)]
+
+    def _index(self, url: str, title: str, text: str):
+        metadata = {
+            "source": url,
+            "url": url,
+            "title": title,
+            "ingestion_timestamp": datetime.now().isoformat(),
+            "source_type": "web"
+        }
+        splits = chunk_documents([Document(page_content=text, metadata=metadata)], *chunk_limits())
+        if self.progress:
+            self.progress(documents=1, chunks=len(splits))
+        return upsert_source(url, {"source": url}, splits, progress=self.progress)
+
+    async def visit(self, client, url: str):
+        """Fetch one page, index it if it changed, and return its outgoing links."""
+        state_key = WEB_PREFIX + url
+        cached = get_state(state_key, {})
+        if not await self.allowed(client, url):
+            self.stats["skipped"] += 1
+            return []
+        if cached.get("hash") and not await asyncio.to_thread(source_exists, url):
+            # The chunks are gone (deleted or wiped); fetch and index afresh.
+            cached = {}
+
+        headers = {}
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+        try:
+            response = await self._get(client, url, headers)
+        except httpx.HTTPError:
+            self.stats["errors"] += 1
+            return []
+
+        if response.status_code == 304:
+            self.stats["not_modified"] += 1
+            return cached.get("links", [])
+        if response.status_code in (404, 410) and cached:
+            # The page is gone; so are its chunks.
+            await asyncio.to_thread(delete_source, url)
+            delete_state(state_key)
+            self.stats["removed"] += 1
+            return []
+        if response.status_code != 200 or "html" not in response.headers.get("content-type", ""):
+            self.stats["skipped"] += 1
+            return []
+        self.stats["fetched"] += 1
+
+        title, text, hrefs = extract_content(response.text)
+        links = list(dict.fromkeys(
+            link for link in (_normalize(urljoin(str(response.url), href)) for href in hrefs)
+            if self.in_scope(link)
+        ))
+
+        content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if content_hash == cached.get("hash"):
+            self.stats["unchanged"] += 1
+        elif text:
+            # Embedding and Chroma writes block, so they run off the event loop.
+            result = await asyncio.to_thread(self._index, url, title, text)
+            self.stats["indexed"] += 1
+            self.stats["chunks_added"] += result["added"]
+
+        set_state(state_key, {
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "hash": content_hash,
+            "links": links[:MAX_STORED_LINKS]
+        })
+        return links
+
+    async def run(self):
+        limits = httpx.Limits(max_connections=get_int("CRAWL_CONCURRENCY", 8))
+        async with httpx.AsyncClient(
+            headers={"User-Agent": self.user_agent},
+            follow_redirects=True,
+            timeout=get_float("CRAWL_TIMEOUT", 20.0),
+            limits=limits
+        ) as client:
+            seen = {self.seed}
+            level = [self.seed]
+            pending = []
+            if self.use_sitemap and self.max_depth > 0:
+                pending = await self.sitemap_urls(client)
+
+            for depth in range(self.max_depth + 1):
+                results = await asyncio.gather(*(self.visit(client, url) for url in level))
+                if depth == self.max_depth:
+                    break
+                level = []
+                for link in pending + [link for links in results for link in links]:
+                    if link not in seen and len(seen) < self.max_pages:
+                        seen.add(link)
+                        level.append(link)
+                pending = []
+                if not level:
+                    break
+        return self.stats
+
+def crawl_site(seed: str, max_depth: int = 1, max_pages: int = 50, same_domain: bool = True, use_sitemap: bool = True, progress=None):
+    """Crawl from `seed` breadth-first and index every page that changed.
+
+    Pages are fetched concurrently through one pooled client, no faster than
+    CRAWL_HOST_DELAY (or robots.txt Crawl-delay) per host. ETag and
+    Last-Modified from the previous crawl are sent back, so unchanged pages
+    answer 304 and cost neither a download nor an embedding.
+    """
+    crawler = Crawler(seed, max_depth, max_pages, same_domain, use_sitemap, progress)
+    return asyncio.run(crawler.run())
@@ -1,32 +1,16 @@
-from langchain_community.document_loaders import WebBaseLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from datetime import datetime
-from backend.core.vector_store import get_vector_store, source_exists
+from backend.ingestion.web_crawler import crawl_site
 
-def process_web_url(url: str):
-    if source_exists(url):
-        return 0
-        
-    loader = WebBaseLoader(url)
-    docs = loader.load()
-    
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200
-    )
-    splits = text_splitter.split_documents(docs)
-    
-    timestamp = datetime.now().isoformat()
-    
-    for split in splits:
-        split.metadata.update({
-            "source": url,
-            "url": url,
-            "ingestion_timestamp": timestamp,
-            "source_type": "web"
-        })
-        
-    vector_store = get_vector_store()
-    vector_store.add_documents(splits)
-    
-    return len(splits)
+def process_web_url(url: str, progress=None):
+    # A single page is a depth-0 crawl: conditional GET, boilerplate stripping,
+    # and unchanged chunks keep their ids and cost no embedding calls.
+    stats = crawl_site(url, max_depth=0, max_pages=1, use_sitemap=False, progress=progress)
+    if stats["errors"]:
+        raise RuntimeError(f"Failed to fetch {url}")
+    # Zero added chunks must mean "unchanged", never "not ingested".
+    if stats["removed"]:
+        raise RuntimeError(f"{url} is gone; its chunks were removed")
+    if stats["skipped"]:
+        raise RuntimeError(f"Skipped {url}: blocked by robots.txt, an HTTP error or not HTML")
+    if not (stats["indexed"] or stats["not_modified"] or stats["unchanged"]):
+        raise RuntimeError(f"No text found at {url}")
+    return stats["chunks_added"]
@@ -1,95 +1,327 @@
 from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
+import json
+import logging
 import shutil
 import os
-from typing import List
+import uuid
+from typing import List, Optional
+from contextlib import asynccontextmanager
 
 load_dotenv()
 
-from backend.core.rag_chain import query_rag
-from backend.core.vector_store import delete_source
+from backend.core.rag_chain import aquery_rag, astream_rag, warm_up
+from backend.core.session_memory import DEFAULT_SESSION
+from backend.core.answer_cache import get_answer_cache_stats
+from backend.core.retrieval import build_where
+from backend.core import metrics
+from backend.core.concurrency import install_default_executor, offload, throttle
+from backend.core.vector_store import delete_source, delete_where, get_embedding_cache_stats
+from backend.core.indexing import get_indexing_stats, reindex_where
+from backend.core.snapshot import create_snapshot, restore_snapshot, compact, list_snapshots, snapshot_root
+from backend.core.jobs import get_job_queue, register_handler
+from backend.core.config import get_setting, get_int
 from backend.ingestion.pdf_loader import process_pdf
 from backend.ingestion.web_loader import process_web_url
+from backend.ingestion.web_crawler import crawl_site
 from backend.ingestion.gmail_loader import process_gmail
 from backend.ingestion.drive_loader import process_drive
 
-app = FastAPI(title="Personal Knowledge AI Agent API")
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = get_setting("JOB_UPLOAD_DIR", "job_uploads")
+
+def _run_pdf_job(params, progress):
+    try:
+        return process_pdf(params["path"], params["filename"], progress=progress)
+    finally:
+        if os.path.exists(params["path"]):
+            os.remove(params["path"])
+
+def _run_web_job(params, progress):
+    return {"chunks": process_web_url(params["url"], progress=progress)}
+
+def _run_crawl_job(params, progress):
+    return crawl_site(
+        params["url"],
+        max_depth=params["max_depth"],
+        max_pages=params["max_pages"],
+        same_domain=params["same_domain"],
+        use_sitemap=params["use_sitemap"],
+        progress=progress
+    )
+
+def _run_gmail_job(params, progress):
+    return {"emails_processed": process_gmail(params["max_results"], progress=progress)}
+
+def _run_drive_job(params, progress):
+    return {"files_processed": process_drive(progress=progress)}
+
+def _run_delete_job(params, progress):
+    return {"chunks_removed": delete_where(params["where"], sources=params["sources"], progress=progress)}
+
+def _run_reindex_job(params, progress):
+    return {"chunks_reindexed": reindex_where(params["where"], progress=progress)}
+
+def _run_snapshot_job(params, progress):
+    return {"snapshot": os.path.basename(create_snapshot(params["dtype"], progress=progress))}
+
+def _run_restore_job(params, progress):
+    path = os.path.join(snapshot_root(), os.path.basename(params["name"])) if params["name"] else None
+    return {"chunks_restored": restore_snapshot(path, progress=progress)}
+
+def _run_compact_job(params, progress):
+    return compact(progress=progress)
+
+register_handler("pdf", _run_pdf_job, concurrency=get_int("JOB_CONCURRENCY_PDF", 2))
+register_handler("web", _run_web_job, concurrency=get_int("JOB_CONCURRENCY_WEB", 4))
+register_handler("crawl", _run_crawl_job, concurrency=get_int("JOB_CONCURRENCY_CRAWL", 2))
+register_handler("gmail", _run_gmail_job, concurrency=1)
+register_handler("drive", _run_drive_job, concurrency=1)
+register_handler("delete", _run_delete_job, concurrency=1)
+register_handler("reindex", _run_reindex_job, concurrency=1)
+register_handler("snapshot", _run_snapshot_job, concurrency=1)
+register_handler("restore", _run_restore_job, concurrency=1)
+register_handler("compact", _run_compact_job, concurrency=1)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    install_default_executor()
+    try:
+        await offload(warm_up)
+    except Exception:
+        logger.warning("Warm-up skipped", exc_info=True)
+    await offload(get_job_queue().start)
+    yield
+    get_job_queue().shutdown()
+
+app = FastAPI(title="Personal Knowledge AI Agent API", lifespan=lifespan)
+
+class ChatFilters(BaseModel):
+    source_types: Optional[List[str]] = None
+    sources: Optional[List[str]] = None
+    senders: Optional[List[str]] = None
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
 
 class ChatRequest(BaseModel):
     query: str
+    session_id: str = DEFAULT_SESSION
+    filters: Optional[ChatFilters] = None
+
+def _where(request: ChatRequest):
+    if request.filters is None:
+        return None
+    try:
+        return build_where(**request.filters.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+class MaintenanceRequest(BaseModel):
+    sources: Optional[List[str]] = None
+    source_types: Optional[List[str]] = None
+    date_before: Optional[str] = None
+    ingested_before: Optional[str] = None
+
+def _maintenance_where(request: MaintenanceRequest):
+    try:
+        return build_where(
+            source_types=request.source_types,
+            sources=request.sources,
+            date_to=request.date_before,
+            ingested_before=request.ingested_before
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+class SnapshotRequest(BaseModel):
+    dtype: Optional[str] = None
+
+class RestoreRequest(BaseModel):
+    name: Optional[str] = None
 
 class WebIngestRequest(BaseModel):
     url: str
 
+class CrawlRequest(BaseModel):
+    url: str
+    max_depth: int = 1
+    max_pages: int = 50
+    same_domain: bool = True
+    use_sitemap: bool = True
+
 @app.get("/")
-def read_root():
+async def read_root():
     return {"status": "PKAA Backend is running"}
 
+def _collect_stats():
+    summary = metrics.summary()
+    return {
+        "embedding_cache": get_embedding_cache_stats(),
+        "answer_cache": get_answer_cache_stats(),
+        "indexing": get_indexing_stats(),
+        "latency_ms": {name: s for name, s in summary.items() if name.endswith("_ms")},
+        # Token counts: chunk sizes, chunks per document, chat history.
+        "sizes": {name: s for name, s in summary.items() if not name.endswith("_ms")}
+    }
+
+@app.get("/stats")
+async def stats():
+    async with throttle("admin"):
+        return await offload(_collect_stats)
+
+def _source_names(docs):
+    return list(set([
+        doc.metadata.get("source", "Unknown")
+        for doc in docs
+    ]))
+
 @app.post("/chat")
-def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest):
+    where = _where(request)
     try:
-        response = query_rag(request.query)
+        async with throttle("chat"):
+            response = await aquery_rag(request.query, request.session_id, where)
         
         answer = response.get("answer", "No answer found.")
-        sources = []
-        if "source_documents" in response:
-            sources = list(set([
-                 doc.metadata.get("source", "Unknown")
-                 for doc in response["source_documents"]
-            ]))
+        sources = _source_names(response.get("source_documents", []))
             
         return {"answer": answer, "sources": sources}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/ingest/pdf")
+def _sse(event: str, data: dict):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """Server-sent events: `sources` first, then `token` events, then `done`."""
+    where = _where(request)
+
+    async def events():
+        try:
+            async with throttle("chat"):
+                async for event in astream_rag(request.query, request.session_id, where):
+                    if event["type"] == "sources":
+                        yield _sse("sources", {"sources": _source_names(event["documents"])})
+                    elif event["type"] == "token":
+                        yield _sse("token", {"text": event["text"]})
+                    else:
+                        yield _sse("done", event["metrics"])
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+def _spool_upload(file, filename: str):
+    # Uploads are spooled to disk so queued jobs survive a restart.
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4().hex}_{os.path.basename(filename)}")
+    with open(path, "wb") as buffer:
+        shutil.copyfileobj(file, buffer)
+    return get_job_queue().submit("pdf", {"path": path, "filename": filename})
+
+@app.post("/ingest/pdf", status_code=202)
 async def ingest_pdf(files: List[UploadFile] = File(...)):
     results = []
-    os.makedirs("temp_uploads", exist_ok=True)
-    for file in files:
-        temp_path = f"temp_uploads/{file.filename}"
-        with open(temp_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        try:
-            doc_id = process_pdf(temp_path, file.filename)
-            results.append({"filename": file.filename, "status": "indexed", "id": doc_id})
-        finally:
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-                
+    async with throttle("ingest"):
+        for file in files:
+            job_id = await offload(_spool_upload, file.file, file.filename)
+            results.append({"filename": file.filename, "status": "queued", "job_id": job_id})
+
     return {"results": results}
 
-@app.post("/ingest/web")
-def ingest_web(request: WebIngestRequest):
-    try:
-        num_chunks = process_web_url(request.url)
-        return {"url": request.url, "status": "indexed", "chunks": num_chunks}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def _submit(kind: str, params: dict):
+    async with throttle("ingest"):
+        return await offload(get_job_queue().submit, kind, params)
 
-@app.post("/sync/gmail")
-def sync_gmail(max_results: int = 10):
-    try:
-        num_emails = process_gmail(max_results)
-        return {"status": "synced", "emails_processed": num_emails}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+@app.post("/ingest/web", status_code=202)
+async def ingest_web(request: WebIngestRequest):
+    job_id = await _submit("web", {"url": request.url})
+    return {"url": request.url, "status": "queued", "job_id": job_id}
 
-@app.post("/sync/drive")
-def sync_drive():
-    try:
-        num_files = process_drive()
-        return {"status": "synced", "files_processed": num_files}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+@app.post("/ingest/crawl", status_code=202)
+async def ingest_crawl(request: CrawlRequest):
+    job_id = await _submit("crawl", request.model_dump())
+    return {"url": request.url, "status": "queued", "job_id": job_id}
+
+@app.post("/sync/gmail", status_code=202)
+async def sync_gmail(max_results: Optional[int] = None):
+    job_id = await _submit("gmail", {"max_results": max_results})
+    return {"status": "queued", "job_id": job_id}
+
+@app.post("/sync/drive", status_code=202)
+async def sync_drive():
+    job_id = await _submit("drive", {})
+    return {"status": "queued", "job_id": job_id}
+
+@app.get("/jobs")
+async def list_jobs(limit: int = 50):
+    return {"jobs": await offload(get_job_queue().list, limit)}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await offload(get_job_queue().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 @app.delete("/docs")
-def remove_source(source: str):
+async def remove_source(source: str):
     """Remove a source (filename or URL) from the vector store."""
     try:
-        num_deleted = delete_source(source)
+        async with throttle("admin"):
+            num_deleted = await offload(delete_source, source)
         return {"source": source, "status": "deleted", "chunks_removed": num_deleted}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/docs/delete", status_code=202)
+async def bulk_delete(request: MaintenanceRequest):
+    """Delete every chunk matching the filters, in a background job."""
+    where = _maintenance_where(request)
+    if where is None:
+        raise HTTPException(status_code=422, detail="Give at least one of sources, source_types, date_before or ingested_before")
+    job_id = await _submit("delete", {"where": where, "sources": request.sources})
+    return {"status": "queued", "job_id": job_id}
+
+@app.post("/docs/reindex", status_code=202)
+async def reindex(request: MaintenanceRequest):
+    """Re-embed the chunks matching the filters (all chunks if none are given)."""
+    job_id = await _submit("reindex", {"where": _maintenance_where(request)})
+    return {"status": "queued", "job_id": job_id}
+
+@app.get("/snapshots")
+async def get_snapshots():
+    return {"snapshots": [manifest for _, manifest in await offload(list_snapshots)]}
+
+@app.post("/snapshots", status_code=202)
+async def take_snapshot(request: SnapshotRequest):
+    """Export vectors, text and metadata to a new snapshot, in a background job."""
+    if request.dtype not in (None, "float32", "float16"):
+        raise HTTPException(status_code=422, detail="dtype must be float32 or float16")
+    job_id = await _submit("snapshot", request.model_dump())
+    return {"status": "queued", "job_id": job_id}
+
+@app.post("/snapshots/restore", status_code=202)
+async def restore(request: RestoreRequest):
+    """Replace the index with a snapshot (the newest if no name is given)."""
+    job_id = await _submit("restore", request.model_dump())
+    return {"status": "queued", "job_id": job_id}
+
+@app.post("/compact", status_code=202)
+async def compact_index():
+    """Rebuild a dense index from a fresh snapshot, in a background job.
+
+    This does not free disk by itself: Chroma keeps the replaced collection's
+    files, so usage grows until `python -m backend.core.snapshot purge` is
+    run with the app stopped.
+    """
+    job_id = await _submit("compact", {})
+    return {
+        "status": "queued",
+        "job_id": job_id,
+        "note": "Disk is reclaimed only by `python -m backend.core.snapshot purge` with the app stopped."
+    }
@@ -0,0 +1,300 @@
+"""End-to-end ingestion and chat benchmark against local stand-ins.
+
+Gemini (chat and embeddings), Gmail, Drive and the web are replaced by the
+fakes in benchmarks/fakes.py, each with a configurable latency, so loaders,
+chunking, embedding batches, the vector store, the keyword index, retrieval
+and the FastAPI /chat endpoint (served by uvicorn on localhost) all run
+offline and repeatably. State goes to a temporary directory. Results can
+be saved as a JSON baseline and a later run compared against it; the exit
+status is 1 on a regression.
+
+    python -m benchmarks.bench_e2e --emails 500 --concurrency 16 --output baseline.json
+    python -m benchmarks.bench_e2e --emails 500 --concurrency 16 --baseline baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+
+# (path in the results, True when higher is better)
+TRACKED = [
+    ("ingestion.pdf.chunks_per_sec", True),
+    ("ingestion.web.chunks_per_sec", True),
+    ("ingestion.gmail.chunks_per_sec", True),
+    ("ingestion.drive.chunks_per_sec", True),
+    ("chat.latency_ms.p50", False),
+    ("chat.latency_ms.p95", False),
+    ("chat.latency_ms.p99", False),
+    ("chat.ttft_ms.p50", False),
+    ("chat.ttft_ms.p95", False),
+    ("chat.requests_per_sec", True),
+    ("peak_rss_mb", False)
+]
+
+def configure(tmp: str, args):
+    """Point every store at `tmp`; must run before backend modules read settings."""
+    os.environ.update({
+        "CHROMA_PERSIST_DIR": os.path.join(tmp, "chroma"),
+        "QUANTIZED_INDEX_DIR": os.path.join(tmp, "quantized"),
+        "KEYWORD_INDEX_PATH": os.path.join(tmp, "keyword.sqlite3"),
+        "EMBEDDING_CACHE_DIR": os.path.join(tmp, "embedding_cache"),
+        "SYNC_STATE_PATH": os.path.join(tmp, "sync_state.sqlite3"),
+        "JOB_DB_PATH": os.path.join(tmp, "jobs.sqlite3"),
+        "JOB_UPLOAD_DIR": os.path.join(tmp, "uploads"),
+        "SNAPSHOT_DIR": os.path.join(tmp, "snapshots"),
+        "VECTOR_BACKEND": args.vector_backend,
+        # Vectors come from the hashing model, so the store records its id.
+        "EMBEDDING_BACKEND": "hashing",
+        "HASHING_EMBEDDING_DIM": str(args.dim),
+        "CRAWL_HOST_DELAY": "0",
+        "GOOGLE_API_KEY": os.environ.get("GOOGLE_API_KEY", "unused")
+    })
+
+def percentiles(values):
+    if not values:
+        return {}
+    values = np.asarray(values)
+    return {"mean": float(values.mean()), **{f"p{q}": float(np.percentile(values, q)) for q in (50, 95, 99)}}
+
+class Counter:
+    """A loader progress callback that totals what it is told."""
+
+    def __init__(self):
+        self.totals = {"documents": 0, "chunks": 0, "embeddings": 0}
+        self._lock = threading.Lock()
+
+    def __call__(self, **counts):
+        with self._lock:
+            for key, value in counts.items():
+                self.totals[key] = self.totals.get(key, 0) + value
+
+def timed(run):
+    progress = Counter()
+    start = time.perf_counter()
+    run(progress)
+    seconds = time.perf_counter() - start
+    return {**progress.totals, "seconds": seconds, "chunks_per_sec": progress.totals["chunks"] / seconds if seconds else 0.0}
+
+def make_pdfs(tmp: str, count: int, pages: int):
+    from benchmarks.bench_pdf_extraction import make_pdf
+
+    paths = []
+    for number in range(count):
+        path = os.path.join(tmp, f"report_{number}.pdf")
+        make_pdf(path, pages, seed=number)
+        paths.append(path)
+    return paths
+
+def make_drive(tmp: str, args):
+    from benchmarks.fakes import FakeDrive, synthetic_text
+    from backend.ingestion.drive_loader import DOC_MIME, PDF_MIME
+
+    rng = random.Random(1)
+    files = []
+    for number in range(args.drive_files):
+        if number % 2:
+            path = make_pdfs(tmp, 1, args.drive_pdf_pages)[0]
+            with open(path, "rb") as f:
+                files.append((f"file{number:04d}", f"Scan {number}.pdf", PDF_MIME, f.read()))
+        else:
+            text = synthetic_text(rng, rng.randint(8, 40)).encode()
+            files.append((f"file{number:04d}", f"Doc {number}", DOC_MIME, text))
+    return FakeDrive(files, args.api_latency_ms)
+
+def ingest(tmp: str, args):
+    from benchmarks.fakes import FakeGmail, install_google_fakes, serve_site
+    from backend.ingestion.pdf_loader import process_pdf
+    from backend.ingestion.web_loader import process_web_url
+    from backend.ingestion.gmail_loader import process_gmail
+    from backend.ingestion.drive_loader import process_drive
+
+    install_google_fakes(FakeGmail(args.emails, args.api_latency_ms), make_drive(tmp, args))
+    pdfs = make_pdfs(tmp, args.pdfs, args.pdf_pages)
+    server, urls = serve_site(args.pages, args.web_latency_ms)
+    try:
+        return {
+            "pdf": timed(lambda progress: [process_pdf(path, os.path.basename(path), progress) for path in pdfs]),
+            "web": timed(lambda progress: [process_web_url(url, progress) for url in urls]),
+            "gmail": timed(lambda progress: process_gmail(progress=progress)),
+            "drive": timed(lambda progress: process_drive(progress))
+        }
+    finally:
+        server.shutdown()
+
+def serve_app():
+    """Run backend.main under uvicorn on a free localhost port; returns (server, thread, URL)."""
+    import socket
+    import uvicorn
+    from backend.main import app
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(app, log_level="warning"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    # The lifespan (warm-up, executor, job queue) finishes before `started` is set.
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("uvicorn failed to start backend.main")
+        time.sleep(0.05)
+    return server, thread, f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+async def chat_load(base_url: str, args):
+    import httpx
+    from benchmarks.fakes import question
+    from backend.core import metrics
+
+    rng = random.Random(2)
+    pool = [question(rng) for _ in range(args.question_pool)] if args.question_pool else None
+    remaining = list(range(args.chat_requests))
+    latencies, ttfts, errors = [], [], 0
+
+    async def client_loop(http, worker: int):
+        nonlocal errors
+        while remaining:
+            number = remaining.pop()
+            # Distinct questions by default, so the answer cache never hits.
+            query = rng.choice(pool) if pool else f"{question(rng)} ({number})"
+            body = {"query": query, "session_id": f"bench-{worker}"}
+            start = time.perf_counter()
+            try:
+                if args.stream:
+                    async with http.stream("POST", "/chat/stream", json=body) as response:
+                        first = None
+                        async for line in response.aiter_lines():
+                            if first is None and line == "event: token":
+                                first = time.perf_counter()
+                            elif line == "event: error":
+                                raise RuntimeError("stream error")
+                        if first is not None:
+                            ttfts.append((first - start) * 1000)
+                else:
+                    response = await http.post("/chat", json=body)
+                    response.raise_for_status()
+            except Exception:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=None) as http:
+        metrics.reset()
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(http, worker) for worker in range(args.concurrency)))
+        seconds = time.perf_counter() - start
+
+    return {
+        "requests": args.chat_requests,
+        "errors": errors,
+        "seconds": seconds,
+        "requests_per_sec": len(latencies) / seconds if seconds else 0.0,
+        "latency_ms": percentiles(latencies),
+        "ttft_ms": percentiles(ttfts),
+        "server": {name: stats for name, stats in metrics.summary().items() if name.startswith("chat")}
+    }
+
+def lookup(results, path: str):
+    for key in path.split("."):
+        if not isinstance(results, dict) or key not in results:
+            return None
+        results = results[key]
+    return results
+
+def compare(results, baseline, tolerance: float):
+    """Print tracked metrics against the baseline; return the regressions."""
+    regressions = []
+    print(f"\n{'metric':<34}{'baseline':>12}{'current':>12}{'change':>9}")
+    for path, higher_is_better in TRACKED:
+        old, new = lookup(baseline, path), lookup(results, path)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        flag = "  REGRESSION" if worse > tolerance else ""
+        print(f"{path:<34}{old:>12.1f}{new:>12.1f}{change:>+9.1%}{flag}")
+        if flag:
+            regressions.append(path)
+    return regressions
+
+def report(results):
+    for source, stats in results["ingestion"].items():
+        print(f"ingest {source:<6} {stats['documents']:>6} docs {stats['chunks']:>7} chunks "
+              f"{stats['seconds']:7.2f}s {stats['chunks_per_sec']:8.1f} chunks/s")
+    chat = results["chat"]
+    latency = chat["latency_ms"]
+    print(f"chat   {chat['requests']} requests, {chat['errors']} errors, {chat['requests_per_sec']:.1f} req/s")
+    if latency:
+        print(f"       latency p50={latency['p50']:.0f}ms p95={latency['p95']:.0f}ms p99={latency['p99']:.0f}ms")
+    if chat["ttft_ms"]:
+        print(f"       first token p50={chat['ttft_ms']['p50']:.0f}ms p95={chat['ttft_ms']['p95']:.0f}ms")
+    for name, stats in sorted(chat["server"].items()):
+        print(f"       {name:<28} p50={stats['p50']:8.1f} p95={stats['p95']:8.1f}")
+    print(f"peak RSS {results['peak_rss_mb']:.0f} MiB (PDF workers {results['peak_rss_children_mb']:.0f} MiB)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", type=int, default=4)
+    parser.add_argument("--pdf-pages", type=int, default=40)
+    parser.add_argument("--pages", type=int, default=20, help="web pages")
+    parser.add_argument("--emails", type=int, default=300)
+    parser.add_argument("--drive-files", type=int, default=20)
+    parser.add_argument("--drive-pdf-pages", type=int, default=8)
+    parser.add_argument("--chat-requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--question-pool", type=int, default=0, help="draw questions from N fixed ones (answer cache hits)")
+    parser.add_argument("--stream", action="store_true", help="drive /chat/stream and record time to first token")
+    parser.add_argument("--api-latency-ms", type=float, default=50.0, help="Gmail and Drive round trip")
+    parser.add_argument("--web-latency-ms", type=float, default=50.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=100.0, help="per embedding request")
+    parser.add_argument("--llm-ttft-ms", type=float, default=400.0)
+    parser.add_argument("--llm-token-ms", type=float, default=10.0)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--vector-backend", choices=["chroma", "quantized"], default="chroma")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="compare with a previous --output")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        configure(tmp, args)
+        from benchmarks.fakes import FakeChatModel, SlowEmbeddings
+        from backend.core import registry
+        from backend.ingestion.pdf_loader import get_pdf_pool
+
+        registry.register("embeddings", SlowEmbeddings(args.dim, args.embed_latency_ms))
+        registry.register("llm", FakeChatModel(ttft_ms=args.llm_ttft_ms, token_ms=args.llm_token_ms, answer_tokens=args.answer_tokens))
+
+        results = {"config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}}
+        results["ingestion"] = ingest(tmp, args)
+        server, thread, base_url = serve_app()
+        try:
+            results["chat"] = asyncio.run(chat_load(base_url, args))
+        finally:
+            server.should_exit = True
+            thread.join()
+        get_pdf_pool().shutdown()
+
+    # ru_maxrss is in KiB on Linux; children covers the PDF worker processes once they exit.
+    results["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    results["peak_rss_children_mb"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    report(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
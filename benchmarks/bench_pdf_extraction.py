@@ -0,0 +1,74 @@
+"""Serial vs. process-pool PDF extraction over a synthetic corpus.
+
+    python -m benchmarks.bench_pdf_extraction --files 4 --pages 300 --workers 4
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import fitz
+
+WORDS = ("invoice meeting project budget quarterly report review deadline draft "
+         "contract proposal schedule summary analysis customer release roadmap").split()
+
+def make_pdf(path: str, pages: int, seed: int):
+    rng = random.Random(seed)
+    pdf = fitz.open()
+    for number in range(pages):
+        page = pdf.new_page()
+        text = "\n".join(
+            " ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(45)
+        )
+        page.insert_textbox(fitz.Rect(36, 36, 576, 806), f"Page {number}\n{text}", fontsize=9)
+    pdf.save(path)
+    pdf.close()
+
+def run(paths, workers: int):
+    os.environ["PDF_WORKERS"] = str(workers)
+    from backend.core import registry
+    from backend.ingestion.pdf_extract import extract_page_range
+    from backend.ingestion.pdf_loader import get_pdf_pool, iter_pages_parallel
+
+    registry.invalidate("pdf_pool")
+    pool = None
+    if workers > 1:
+        # Spawn every worker before timing; start-up is a one-off per process.
+        pool = get_pdf_pool()
+        for future in [pool.submit(extract_page_range, paths[0], 0, 1) for _ in range(workers)]:
+            future.result()
+
+    pages = chunks = 0
+    start = time.perf_counter()
+    for path in paths:
+        for number, splits in enumerate(iter_pages_parallel(path)):
+            # Ordering must survive sharding.
+            assert all(split.metadata["page"] == number for split in splits)
+            pages += 1
+            chunks += len(splits)
+    elapsed = time.perf_counter() - start
+    if pool:
+        pool.shutdown()
+    return pages, chunks, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(args.files):
+            path = os.path.join(tmp, f"synthetic_{i}.pdf")
+            make_pdf(path, args.pages, seed=i)
+            paths.append(path)
+
+        for workers in (1, args.workers):
+            pages, chunks, elapsed = run(paths, workers)
+            print(f"workers={workers:<3} pages={pages} chunks={chunks} "
+                  f"time={elapsed:.2f}s pages/sec={pages / elapsed:.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""Local stand-ins for Gemini, Gmail, Drive and the web, with configurable latency.
+
+The Google fakes are duck-typed to the googleapiclient calls the loaders
+make; Drive downloads still go through the real MediaIoBaseDownload.
+"""
+import asyncio
+import base64
+import random
+import re
+import threading
+import time
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from backend.core.local_embeddings import HashingEmbeddings
+
+TOPICS = ("atlas", "budget", "hiring", "roadmap", "invoice", "migration", "launch", "audit",
+          "vendor", "security", "onboarding", "forecast", "contract", "retention", "pricing", "outage")
+WORDS = ("the team agreed to review quarterly numbers before the deadline and share a draft "
+         "with finance while engineering tracks open risks customers asked about delivery dates "
+         "support escalated two tickets the proposal needs legal sign off next week").split()
+
+def sentence(rng: random.Random, topic: str):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(10, 22))]
+    words.insert(rng.randrange(len(words)), topic)
+    return " ".join(words).capitalize() + "."
+
+def synthetic_text(rng: random.Random, paragraphs: int, topic: str = None):
+    """Paragraphs about one topic, with a heading every few paragraphs."""
+    topic = topic or rng.choice(TOPICS)
+    blocks = []
+    for number in range(paragraphs):
+        if number % 4 == 0:
+            blocks.append(f"{topic.title()} {rng.choice(['Overview', 'Status', 'Risks', 'Next Steps'])}")
+        blocks.append(" ".join(sentence(rng, topic) for _ in range(rng.randint(2, 6))))
+    return "\n\n".join(blocks)
+
+def question(rng: random.Random):
+    return f"What is the latest on the {rng.choice(TOPICS)} {rng.choice(['deadline', 'draft', 'risks', 'numbers', 'tickets'])}?"
+
+class FakeChatModel(BaseChatModel):
+    """Answers with words from the prompt, paced like a streaming Gemini call."""
+
+    ttft_ms: float = 300.0
+    token_ms: float = 10.0
+    answer_tokens: int = 60
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    def _tokens(self, messages):
+        words = re.findall(r"\w+", " ".join(str(m.content) for m in messages))
+        return [word + " " for word in words[:self.answer_tokens]] or ["Information not found in your data."]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._tokens(messages)
+        time.sleep((self.ttft_ms + self.token_ms * len(tokens)) / 1000)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._tokens(messages)
+        await asyncio.sleep((self.ttft_ms + self.token_ms * len(tokens)) / 1000)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.ttft_ms / 1000)
+        for token in self._tokens(messages):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+            time.sleep(self.token_ms / 1000)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.ttft_ms / 1000)
+        for token in self._tokens(messages):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+            await asyncio.sleep(self.token_ms / 1000)
+
+class SlowEmbeddings(Embeddings):
+    """Hashing embeddings that take `latency_ms` per request, like a remote model."""
+
+    def __init__(self, dim: int, latency_ms: float):
+        self.inner = HashingEmbeddings(dim)
+        self.latency_ms = latency_ms
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def _wait(self):
+        with self._lock:
+            self.requests += 1
+        time.sleep(self.latency_ms / 1000)
+
+    def embed_documents(self, texts):
+        self._wait()
+        return self.inner.embed_documents(texts)
+
+    def embed_query(self, text: str):
+        self._wait()
+        return self.inner.embed_query(text)
+
+class _Request:
+    def __init__(self, value, latency_ms: float):
+        self.value = value
+        self.latency_ms = latency_ms
+
+    def execute(self):
+        time.sleep(self.latency_ms / 1000)
+        return self.value
+
+class _Batch:
+    def __init__(self, latency_ms: float, callback):
+        self.latency_ms = latency_ms
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request, request_id))
+
+    def execute(self):
+        # One round trip for the whole batch, as with the real batch endpoint.
+        time.sleep(self.latency_ms / 1000)
+        for request, request_id in self.requests:
+            self.callback(request_id, request.value, None)
+
+class FakeGmail:
+    """A mailbox of `count` synthetic messages, some replying to earlier ones."""
+
+    def __init__(self, count: int, latency_ms: float, seed: int = 0):
+        rng = random.Random(seed)
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        self.latency_ms = latency_ms
+        self.store = {}
+        for number in range(count):
+            topic = rng.choice(TOPICS)
+            body = synthetic_text(rng, rng.randint(1, 6), topic)
+            if number and rng.random() < 0.4:
+                body += "\n\nOn Mon, 3 Feb 2025 at 10:00, Jane <jane@example.com> wrote:\n> " + sentence(rng, topic)
+            date = start + timedelta(hours=number)
+            message_id = f"{number:08x}"
+            self.store[message_id] = {
+                "id": message_id,
+                "payload": {
+                    "mimeType": "multipart/alternative",
+                    "headers": [
+                        {"name": "Subject", "value": f"{topic.title()} update {number}"},
+                        {"name": "From", "value": f"Colleague {number % 17} <person{number % 17}@example.com>"},
+                        {"name": "Date", "value": format_datetime(date)}
+                    ],
+                    "parts": [
+                        {"mimeType": "text/plain", "body": {"data": base64.urlsafe_b64encode(body.encode()).decode()}},
+                        {"mimeType": "text/html", "body": {"data": ""}}
+                    ]
+                }
+            }
+        self._ids = sorted(self.store, reverse=True)
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def getProfile(self, userId):
+        return _Request({"historyId": "1000"}, self.latency_ms)
+
+    def history(self):
+        return _History(self.latency_ms)
+
+    def list(self, userId, maxResults, pageToken=None):
+        start = int(pageToken or 0)
+        page = {"messages": [{"id": i} for i in self._ids[start:start + maxResults]]}
+        if start + maxResults < len(self._ids):
+            page["nextPageToken"] = str(start + maxResults)
+        return _Request(page, self.latency_ms)
+
+    def get(self, userId, id):
+        return _Request(self.store[id], 0)
+
+    def new_batch_http_request(self, callback):
+        return _Batch(self.latency_ms, callback)
+
+class _History:
+    def __init__(self, latency_ms: float):
+        self.latency_ms = latency_ms
+
+    def list(self, userId, startHistoryId, historyTypes, pageToken=None):
+        return _Request({"history": [], "historyId": startHistoryId}, self.latency_ms)
+
+class _Response(dict):
+    status = 200
+
+class _MediaHttp:
+    def __init__(self, content: bytes, latency_ms: float):
+        self.content = content
+        self.latency_ms = latency_ms
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        time.sleep(self.latency_ms / 1000)
+        return _Response({"content-length": str(len(self.content))}), self.content
+
+class _MediaRequest:
+    def __init__(self, uri: str, content: bytes, latency_ms: float):
+        self.uri = uri
+        self.headers = {}
+        self.http = _MediaHttp(content, latency_ms)
+
+class FakeDrive:
+    """Google Docs (exported as text) and PDFs, listed and downloaded like Drive."""
+
+    def __init__(self, files, latency_ms: float):
+        # files: (file id, name, mime type, content bytes)
+        self.latency_ms = latency_ms
+        self.files_ = {file_id: (name, mime_type, content) for file_id, name, mime_type, content in files}
+
+    def files(self):
+        return self
+
+    def changes(self):
+        return _Changes(self.latency_ms)
+
+    def list(self, pageSize, fields, q, pageToken=None):
+        ids = sorted(self.files_)
+        start = int(pageToken or 0)
+        page = {"files": [
+            {"id": i, "name": self.files_[i][0], "mimeType": self.files_[i][1], "modifiedTime": "2025-06-01T00:00:00.000Z", "trashed": False}
+            for i in ids[start:start + pageSize]
+        ]}
+        if start + pageSize < len(ids):
+            page["nextPageToken"] = str(start + pageSize)
+        return _Request(page, self.latency_ms)
+
+    def export_media(self, fileId, mimeType):
+        return _MediaRequest(f"https://drive.invalid/{fileId}/export", self.files_[fileId][2], self.latency_ms)
+
+    def get_media(self, fileId):
+        return _MediaRequest(f"https://drive.invalid/{fileId}", self.files_[fileId][2], self.latency_ms)
+
+class _Changes:
+    def __init__(self, latency_ms: float):
+        self.latency_ms = latency_ms
+
+    def getStartPageToken(self):
+        return _Request({"startPageToken": "1"}, self.latency_ms)
+
+    def list(self, pageToken, pageSize, fields):
+        return _Request({"changes": [], "newStartPageToken": pageToken}, self.latency_ms)
+
+def install_google_fakes(gmail: FakeGmail, drive: FakeDrive):
+    from backend.ingestion import gmail_loader, drive_loader
+
+    gmail_loader.build = lambda *args, **kwargs: gmail
+    drive_loader.build = lambda *args, **kwargs: drive
+    gmail_loader.get_google_credentials = drive_loader.get_google_credentials = lambda: None
+
+def serve_site(pages: int, latency_ms: float, seed: int = 0):
+    """Serve `pages` synthetic HTML pages on localhost; returns (server, page URLs)."""
+    rng = random.Random(seed)
+    bodies = {}
+    for number in range(pages):
+        topic = rng.choice(TOPICS)
+        paragraphs = "".join(f"<p>{p}</p>" for p in synthetic_text(rng, rng.randint(4, 16), topic).split("\n\n"))
+        bodies[f"/page/{number}"] = (
+            f"<html><head><title>{topic.title()} notes {number}</title></head><body>"
+            f"<nav><a href='/page/{(number + 1) % pages}'>Next</a></nav>"
+            f"<main><h1>{topic.title()}</h1>{paragraphs}</main><footer>Copyright</footer></body></html>"
+        ).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency_ms / 1000)
+            body = bodies.get(self.path)
+            self.send_response(200 if body else 404)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body or b"")))
+            self.end_headers()
+            self.wfile.write(body or b"")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    return server, [base + path for path in bodies]
@@ -1,10 +1,45 @@
 import streamlit as st
 import requests
+import json
 import os
+import time
+import uuid
 
 
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
 
+def wait_for_job(job_id, timeout=600):
+    status = st.empty()
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = requests.get(f"{BACKEND_URL}/jobs/{job_id}").json()
+        progress = job["progress"]
+        status.caption(
+            f"{job['status']}: {progress['documents']} documents, "
+            f"{progress['chunks']} chunks, {progress['embeddings']} embedded"
+        )
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(1)
+    return None
+
+def stream_chat(prompt, sources):
+    """Yield answer tokens from /chat/stream, collecting sources as they arrive."""
+    with requests.post(f"{BACKEND_URL}/chat/stream", json={"query": prompt, "session_id": st.session_state.session_id}, stream=True) as response:
+        response.raise_for_status()
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+                if event == "sources":
+                    sources.extend(data["sources"])
+                elif event == "token":
+                    yield data["text"]
+                elif event == "error":
+                    raise RuntimeError(data["detail"])
+
 st.set_page_config(page_title="PKAA - Personal Knowledge AI Agent", layout="wide")
 
 st.title(" PKAA: Personal Knowledge AI Agent")
@@ -21,8 +56,13 @@ with st.sidebar:
         with st.spinner("Indexing PDFs..."):
             files = [("files", (f.name, f.getvalue(), "application/pdf")) for f in uploaded_files]
             response = requests.post(f"{BACKEND_URL}/ingest/pdf", files=files)
-            if response.status_code == 200:
-                st.success("PDFs indexed successfully!")
+            if response.status_code == 202:
+                for item in response.json()["results"]:
+                    job = wait_for_job(item["job_id"])
+                    if job and job["status"] == "succeeded":
+                        st.success(f"'{item['filename']}' indexed successfully!")
+                    else:
+                        st.error(f"Failed to index '{item['filename']}'.")
             else:
                 st.error("Failed to index PDFs.")
 
@@ -34,7 +74,8 @@ with st.sidebar:
     if st.button("Ingest Website") and web_url:
         with st.spinner("Ingesting website..."):
             response = requests.post(f"{BACKEND_URL}/ingest/web", json={"url": web_url})
-            if response.status_code == 200:
+            job = wait_for_job(response.json()["job_id"]) if response.status_code == 202 else None
+            if job and job["status"] == "succeeded":
                 st.success("Website indexed!")
             else:
                 st.error("Failed to index website.")
@@ -48,16 +89,18 @@ with st.sidebar:
         if st.button("Sync Gmail"):
             with st.spinner("Syncing Gmail..."):
                 response = requests.post(f"{BACKEND_URL}/sync/gmail")
-                if response.status_code == 200:
-                    st.success(f"Gmail synced! ({response.json()['emails_processed']} emails)")
+                job = wait_for_job(response.json()["job_id"]) if response.status_code == 202 else None
+                if job and job["status"] == "succeeded":
+                    st.success(f"Gmail synced! ({job['result']['emails_processed']} emails)")
                 else:
                     st.error("Failed to sync Gmail.")
     with col2:
         if st.button("Sync Drive"):
             with st.spinner("Syncing Drive..."):
                 response = requests.post(f"{BACKEND_URL}/sync/drive")
-                if response.status_code == 200:
-                    st.success(f"Drive synced! ({response.json()['files_processed']} files)")
+                job = wait_for_job(response.json()["job_id"]) if response.status_code == 202 else None
+                if job and job["status"] == "succeeded":
+                    st.success(f"Drive synced! ({job['result']['files_processed']} files)")
                 else:
                     st.error("Failed to sync Drive.")
 
@@ -66,6 +109,8 @@ st.header(" Chat with your Knowledge Base")
 
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 
 for message in st.session_state.messages:
@@ -83,23 +128,18 @@ if prompt := st.chat_input("Ask me anything about your data..."):
     st.session_state.messages.append({"role": "user", "content": prompt})
 
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            response = requests.post(f"{BACKEND_URL}/chat", json={"query": prompt})
-            if response.status_code == 200:
-                data = response.json()
-                answer = data["answer"]
-                sources = data["sources"]
-                
-                st.markdown(answer)
-                if sources:
-                    with st.expander("Sources"):
-                        for source in sources:
-                            st.write(f"- {source}")
-                
-                st.session_state.messages.append({
-                    "role": "assistant", 
-                    "content": answer,
-                    "sources": sources
-                })
-            else:
-                st.error("Communication error with backend.")
+        try:
+            sources = []
+            answer = st.write_stream(stream_chat(prompt, sources))
+            if sources:
+                with st.expander("Sources"):
+                    for source in sources:
+                        st.write(f"- {source}")
+            
+            st.session_state.messages.append({
+                "role": "assistant", 
+                "content": answer,
+                "sources": sources
+            })
+        except Exception:
+            st.error("Communication error with backend.")
@@ -1,6 +1,8 @@
 import streamlit as st
+import logging
 import os
 import sys
+import uuid
 import importlib.metadata
 import google.generativeai as genai
 from dotenv import load_dotenv
@@ -17,7 +19,7 @@ except ImportError as e:
     st.info("Please try: Manage App > ... > Clear Cache and Deploy")
     st.stop()
 
-from backend.core.rag_chain import query_rag
+from backend.core.rag_chain import stream_rag, warm_up
 from backend.core.vector_store import delete_source
 from backend.ingestion.pdf_loader import process_pdf
 from backend.ingestion.web_loader import process_web_url
@@ -26,6 +28,21 @@ from backend.ingestion.drive_loader import process_drive
 
 st.set_page_config(page_title="PKAA Portfolio Demo", layout="wide")
 
+@st.cache_resource
+def _warm_up():
+    # Once per process: builds the store and chain; an empty store is filled
+    # from the newest snapshot only when SNAPSHOT_RESTORE_ON_START is set.
+    try:
+        warm_up()
+    except Exception:
+        logging.getLogger(__name__).warning("Warm-up skipped", exc_info=True)
+
+_warm_up()
+
+def _prepend(first, rest):
+    yield first
+    yield from rest
+
 st.title("PKAA: Personal Knowledge AI Agent")
 st.markdown("Connect your PDFs, websites, or Google services to build a private knowledge base.")
 
@@ -73,10 +90,13 @@ with st.sidebar:
             st.write("---")
             st.write("**Vector Store Status:**")
             try:
-                from backend.core.vector_store import get_vector_store, wipe_vector_store
+                from backend.core.vector_store import get_vector_store, wipe_vector_store, get_embedding_cache_stats
                 vs = get_vector_store()
                 count = vs._collection.count()
                 st.write(f"- Total documents in index: `{count}`")
+                cache_stats = get_embedding_cache_stats()
+                if cache_stats:
+                    st.write(f"- Embedding cache: `{cache_stats['hits']}` hits / `{cache_stats['misses']}` misses ({cache_stats['entries']} entries)")
                 
                 if st.button("Wipe Database", type="secondary"):
                     wipe_vector_store()
@@ -92,22 +112,15 @@ with st.sidebar:
     uploaded_files = st.file_uploader("Choose PDF files", accept_multiple_files=True, type=['pdf'])
     if st.button("Index PDFs") and uploaded_files:
         with st.spinner("Indexing PDFs..."):
-            os.makedirs("temp_uploads", exist_ok=True)
             for f in uploaded_files:
-                temp_path = f"temp_uploads/{f.name}"
-                with open(temp_path, "wb") as buffer:
-                    buffer.write(f.getvalue())
                 try:
-                    result = process_pdf(temp_path, f.name)
+                    result = process_pdf(f.getvalue(), f.name)
                     if result == "already_indexed":
                         st.info(f"'{f.name}' is already indexed.")
                     else:
                         st.success(f"'{f.name}' indexed successfully!")
                 except Exception as e:
                     st.error(f"Failed to index '{f.name}': {str(e)}")
-                finally:
-                    if os.path.exists(temp_path):
-                        os.remove(temp_path)
             st.rerun()
 
     st.divider()
@@ -116,11 +129,14 @@ with st.sidebar:
     web_url = st.text_input("Enter URL")
     if st.button("Ingest Website") and web_url:
         with st.spinner("Ingesting website..."):
-            num_chunks = process_web_url(web_url)
-            if num_chunks > 0:
-                st.success(f"Website indexed! ({num_chunks} chunks)")
-            else:
-                st.warning("Website already indexed or no content found.")
+            try:
+                num_chunks = process_web_url(web_url)
+                if num_chunks > 0:
+                    st.success(f"Website indexed! ({num_chunks} chunks)")
+                else:
+                    st.info("Website already indexed and unchanged.")
+            except Exception as e:
+                st.error(f"Website ingestion failed: {str(e)}")
 
     st.divider()
     
@@ -147,6 +163,8 @@ st.header("Chat with your Knowledge Base")
 
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
@@ -162,25 +180,32 @@ if prompt := st.chat_input("Ask me anything about your data..."):
     st.session_state.messages.append({"role": "user", "content": prompt})
 
     with st.chat_message("assistant"):
-        with st.spinner("Searching and thinking..."):
-            try:
-                response = query_rag(prompt)
-                answer = response.get("answer", "No answer found.")
-                sources = list(set([
-                    doc.metadata.get("source", "Unknown")
-                    for doc in response.get("source_documents", [])
-                ]))
-                
-                st.markdown(answer)
-                if sources:
-                    with st.expander("Sources"):
-                        for source in sources:
-                            st.write(f"- {source}")
-                
-                st.session_state.messages.append({
-                    "role": "assistant", 
-                    "content": answer,
-                    "sources": sources
-                })
-            except Exception as e:
-                st.error(f"Error: {str(e)}")
+        try:
+            sources = []
+
+            def tokens():
+                for event in stream_rag(prompt, st.session_state.session_id):
+                    if event["type"] == "sources":
+                        sources.extend(set(
+                            doc.metadata.get("source", "Unknown")
+                            for doc in event["documents"]
+                        ))
+                    elif event["type"] == "token":
+                        yield event["text"]
+
+            with st.spinner("Searching and thinking..."):
+                stream = tokens()
+                first_token = next(stream, "")
+            answer = st.write_stream(_prepend(first_token, stream))
+            if sources:
+                with st.expander("Sources"):
+                    for source in sources:
+                        st.write(f"- {source}")
+            
+            st.session_state.messages.append({
+                "role": "assistant", 
+                "content": answer,
+                "sources": sources
+            })
+        except Exception as e:
+            st.error(f"Error: {str(e)}")
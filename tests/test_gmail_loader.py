@@ -0,0 +1,102 @@
+from backend.ingestion import gmail_loader
+
+
+class _Request:
+    def __init__(self, value):
+        self.value = value
+
+    def execute(self):
+        return self.value
+
+
+class _Mailbox:
+    """Just enough of the Gmail API for one incremental sync."""
+
+    def __init__(self, history):
+        self.history_records = history
+
+    def users(self):
+        return self
+
+    def history(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def list(self, userId, startHistoryId, historyTypes, pageToken=None):
+        return _Request({"history": self.history_records, "historyId": "1005"})
+
+    def new_batch_http_request(self, callback):
+        raise AssertionError("a deleted message was fetched")
+
+
+def test_message_added_then_deleted_is_not_fetched(monkeypatch):
+    mailbox = _Mailbox([
+        {"messagesAdded": [{"message": {"id": "gone"}}]},
+        {"messagesDeleted": [{"message": {"id": "gone"}}]},
+    ])
+    saved, deleted = {}, []
+    monkeypatch.setattr(gmail_loader, "get_google_credentials", lambda: None)
+    monkeypatch.setattr(gmail_loader, "build", lambda *args, **kwargs: mailbox)
+    monkeypatch.setattr(gmail_loader, "get_state", lambda key, default=None: {"history_id": "1000"})
+    monkeypatch.setattr(gmail_loader, "set_state", saved.__setitem__)
+    monkeypatch.setattr(gmail_loader, "_has_gmail_chunks", lambda: True)
+    monkeypatch.setattr(gmail_loader, "_indexed_email_ids", lambda ids: set())
+    monkeypatch.setattr(gmail_loader, "delete_chunks", lambda where: deleted.append(where))
+
+    assert gmail_loader.process_gmail() == 0
+    assert deleted == [{"email_id": {"$in": ["gone"]}}]
+    assert saved == {gmail_loader.STATE_KEY: {"history_id": "1005"}}
+
+
+class _Response(dict):
+    def __init__(self, status):
+        super().__init__()
+        self.status = status
+        self.reason = ""
+
+
+class _Batch:
+    def __init__(self, callback, messages):
+        self.callback = callback
+        self.messages = messages
+        self.ids = []
+
+    def add(self, request, request_id):
+        self.ids.append(request_id)
+
+    def execute(self):
+        for message_id in self.ids:
+            if message_id in self.messages:
+                self.callback(message_id, self.messages[message_id], None)
+            else:
+                self.callback(message_id, None, gmail_loader.HttpError(_Response(404), b""))
+
+
+class _Messages:
+    def __init__(self, store):
+        self.store = store
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def get(self, userId, id):
+        return None
+
+    def new_batch_http_request(self, callback):
+        return _Batch(callback, self.store)
+
+
+def test_missing_message_is_skipped_and_counted():
+    body = {"mimeType": "text/plain", "body": {"data": "aGVsbG8="}, "headers": [{"name": "Subject", "value": "Hi"}]}
+    service = _Messages({"kept": {"id": "kept", "payload": body}})
+    counted = []
+
+    batches = list(gmail_loader.fetch_gmail_emails(service, ["kept", "gone"], lambda errors=0: counted.append(errors)))
+
+    assert [doc.metadata["email_id"] for docs in batches for doc in docs] == ["kept"]
+    assert counted == [1]